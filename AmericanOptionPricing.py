@@ -0,0 +1,162 @@
+import time
+import numpy as np
+from BlackScholes import _is_call, call_option_price, put_option_price
+
+# time steps of the lattices and exercise dates of Longstaff-Schwartz by default
+NUM_STEPS = 500
+NUM_EXERCISE_DATES = 50
+NUM_PATHS = 100000
+# degree of the polynomial in S/E used to estimate the continuation value
+REGRESSION_DEGREE = 3
+LATTICE_METHODS = ('binomial', 'trinomial')
+
+def _contracts(S, E, T, rf, sigma, option_type):
+    # every argument can be a scalar or an array, they are broadcast into one batch of contracts with
+    # shape (contracts, 1) so they line up against the nodes of a time level
+    S, E, T, rf, sigma = (np.asarray(x, dtype=np.float64) for x in (S, E, T, rf, sigma))
+    S, E, T, rf, sigma, is_call = np.broadcast_arrays(S, E, T, rf, sigma, _is_call(option_type))
+    # payoff is max(phi * (S - E), 0) with phi = 1 for calls and -1 for puts
+    phi = np.where(is_call, 1.0, -1.0)
+    return [np.atleast_1d(x).reshape(-1, 1) for x in (S, E, T, rf, sigma, phi)], np.shape(S)
+
+def lattice_price(S, E, T, rf, sigma, option_type='put', num_steps=NUM_STEPS, method='binomial', american=True):
+    # American (or European) option prices by backward induction on a recombining lattice
+    #   'binomial'  - Cox-Ross-Rubinstein, up move u = exp(sigma sqrt(dt)), down move 1/u
+    #   'trinomial' - Boyle, moves of exp(+-sigma sqrt(2 dt)) or none
+    # the whole batch of contracts is one array of shape (contracts, nodes), every time level is one vectorized step
+    # over all nodes and contracts: continuation from slices of the level above, then the early exercise check
+    (S, E, T, rf, sigma, phi), shape = _contracts(S, E, T, rf, sigma, option_type)
+    dt = T / num_steps
+    discount = np.exp(-rf * dt)
+
+    if method == 'binomial':
+        u = np.exp(sigma * np.sqrt(dt))
+        p_up = (np.exp(rf * dt) - 1 / u) / (u - 1 / u)
+        # stock prices at maturity S u^(2j - N), j = 0 ... N
+        stock = S * u ** (2 * np.arange(num_steps + 1) - num_steps)
+    elif method == 'trinomial':
+        u = np.exp(sigma * np.sqrt(2 * dt))
+        half_up, half_down = np.exp(sigma * np.sqrt(dt / 2)), np.exp(-sigma * np.sqrt(dt / 2))
+        p_up = ((np.exp(rf * dt / 2) - half_down) / (half_up - half_down)) ** 2
+        p_down = ((half_up - np.exp(rf * dt / 2)) / (half_up - half_down)) ** 2
+        p_middle = 1 - p_up - p_down
+        # stock prices at maturity S u^(j - N), j = 0 ... 2N
+        stock = S * u ** (np.arange(2 * num_steps + 1) - num_steps)
+    else:
+        raise ValueError('unknown lattice method %r' % method)
+
+    values = np.maximum(phi * (stock - E), 0)
+    for _ in range(num_steps):
+        if method == 'binomial':
+            values = discount * (p_up * values[:, 1:] + (1 - p_up) * values[:, :-1])
+            # node j one level earlier is node j of this level moved down once
+            stock = stock[:, :-1] * u
+        else:
+            values = discount * (p_up * values[:, 2:] + p_middle * values[:, 1:-1] + p_down * values[:, :-2])
+            stock = stock[:, 1:-1]
+        if american:
+            np.maximum(values, phi * (stock - E), out=values)
+
+    return values[:, 0].reshape(shape)
+
+def _basis(x, degree):
+    # 1, x, x^2, ... along a last axis, by repeated multiplication rather than a power per element
+    X = np.empty(x.shape + (degree + 1,))
+    X[..., 0] = 1
+    for i in range(1, degree + 1):
+        np.multiply(X[..., i-1], x, out=X[..., i])
+    return X
+
+def longstaff_schwartz(S, E, T, rf, sigma, option_type='put', num_paths=NUM_PATHS, num_dates=NUM_EXERCISE_DATES,
+                       degree=REGRESSION_DEGREE, rng=None):
+    # American option prices by least squares Monte Carlo on risk-neutral GBM paths, exercisable on num_dates equally
+    # spaced dates; S, T, rf and sigma describe one underlying, E and option_type can be arrays of contracts on it
+    # that share the same paths
+    # the paths are generated backwards in time with a Brownian bridge: W(T) first and then W(t_k) given W(t_k+1),
+    # which is normal with mean t_k/t_k+1 W(t_k+1) and variance t_k (t_k+1 - t_k) / t_k+1, so the induction only ever
+    # holds the current date, O(paths) memory instead of O(paths x dates)
+    # at every date the continuation values of all contracts are regressed on polynomials of S/E over their in the
+    # money paths in one batched least squares solve
+    # returns (prices, standard errors) with one entry per contract
+    # rng can be a numpy Generator, by default the global np.random state is used
+    rng = np.random if rng is None else rng
+    E, is_call = np.broadcast_arrays(np.asarray(E, dtype=np.float64), _is_call(option_type))
+    shape = E.shape
+    E = np.atleast_1d(E).reshape(-1, 1)
+    phi = np.where(np.atleast_1d(is_call).reshape(-1, 1), 1.0, -1.0)
+
+    dt = T / num_dates
+    times = dt * np.arange(num_dates + 1)
+    drift = rf - 0.5 * sigma ** 2
+    W = np.sqrt(T) * rng.standard_normal(num_paths)
+    # discounted to the current date: the cash flow each path receives under the exercise policy found so far
+    values = np.maximum(phi * (S * np.exp(drift * T + sigma * W) - E), 0)
+
+    for k in range(num_dates - 1, 0, -1):
+        W = times[k] / times[k+1] * W + np.sqrt(times[k] * dt / times[k+1]) * rng.standard_normal(num_paths)
+        stock = S * np.exp(drift * times[k] + sigma * W)
+        values *= np.exp(-rf * dt)
+
+        exercise = np.maximum(phi * (stock - E), 0)
+        in_the_money = exercise > 0
+        X = _basis(stock / E, degree)
+        # weighted normal equations X'WX b = X'Wy for every contract at once, W selects its in the money paths
+        weights = X * in_the_money[..., None]
+        # (batched matrix products go through BLAS)
+        weights_t = weights.transpose(0, 2, 1)
+        gram = weights_t @ X
+        moments = weights_t @ values[..., None]
+        # a tiny ridge keeps the systems solvable when a contract has (almost) no paths in the money
+        gram += 1e-12 * np.eye(degree + 1)
+        continuation = (X @ np.linalg.solve(gram, moments))[..., 0]
+
+        exercise_now = in_the_money & (exercise > continuation)
+        values = np.where(exercise_now, exercise, values)
+
+    values *= np.exp(-rf * dt)
+    # exercising at time 0 is worth the intrinsic value
+    prices = np.maximum(values.mean(axis=1), np.maximum(phi[:, 0] * (S - E[:, 0]), 0))
+    std_errors = values.std(axis=1, ddof=1) / np.sqrt(num_paths)
+    return prices.reshape(shape), std_errors.reshape(shape)
+
+def benchmark_american(S=100.0, E=100.0, T=1.0, rf=0.05, sigma=0.2):
+    reference = lattice_price(S, E, T, rf, sigma, 'put', 20000)
+    print('American put reference (binomial, 20000 steps): %.5f' % reference)
+    print('European put (Black-Scholes): %.5f, lattice %.5f'
+          % (put_option_price(S, E, T, rf, sigma), lattice_price(S, E, T, rf, sigma, 'put', 1000, american=False)))
+
+    for method in LATTICE_METHODS:
+        for steps in (50, 100, 200, 500, 1000, 2000):
+            start = time.perf_counter()
+            price = lattice_price(S, E, T, rf, sigma, 'put', steps, method)
+            print('%-9s %5d steps: %.5f  error %+.5f  %.4fs'
+                  % (method, steps, price, price - reference, time.perf_counter() - start))
+
+    # a whole book of contracts in one batch
+    rng = np.random.default_rng(0)
+    num_contracts = 1000
+    strikes = rng.uniform(80, 120, num_contracts)
+    maturities = rng.uniform(0.1, 2, num_contracts)
+    types = rng.choice(['call', 'put'], num_contracts)
+    start = time.perf_counter()
+    lattice_price(S, strikes, maturities, rf, sigma, types, NUM_STEPS)
+    print('%d contracts x %d binomial steps in one batch: %.2fs' % (num_contracts, NUM_STEPS, time.perf_counter() - start))
+
+    for paths in (10**4, 10**5, 10**6):
+        start = time.perf_counter()
+        price, std_error = longstaff_schwartz(S, E, T, rf, sigma, 'put', paths, rng=np.random.default_rng(1))
+        print('Longstaff-Schwartz %7d paths x %d dates: %.5f +- %.5f  error %+.5f  %.2fs'
+              % (paths, NUM_EXERCISE_DATES, price, std_error, price - reference, time.perf_counter() - start))
+
+    start = time.perf_counter()
+    strikes = np.linspace(80, 120, 9)
+    prices, _ = longstaff_schwartz(S, strikes, T, rf, sigma, 'put', NUM_PATHS, rng=np.random.default_rng(2))
+    print('%d strikes on shared paths in %.2fs, largest difference from the lattice %.4f'
+          % (len(strikes), time.perf_counter() - start,
+             np.max(np.abs(prices - lattice_price(S, strikes, T, rf, sigma, 'put', 2000)))))
+
+if __name__ == '__main__':
+    print('American put: %.4f, American call (no dividends, same as European %.4f): %.4f'
+          % (lattice_price(100, 100, 1, 0.05, 0.2, 'put'), call_option_price(100, 100, 1, 0.05, 0.2),
+             lattice_price(100, 100, 1, 0.05, 0.2, 'call')))
+    benchmark_american()
@@ -0,0 +1,157 @@
+import time
+import numpy as np
+from BondPortfolio import cash_flow_matrix, price_bonds
+
+# one basis point, DV01 is the fall in price for a yield move of this size
+BASIS_POINT = 1e-4
+
+class _Flows:
+    # ragged cash flows of a bond book (see BondPortfolio.cash_flow_matrix) with the compounding frequency of every flow
+    def __init__(self, times, flows, offsets, frequency):
+        self.times = times
+        self.flows = flows
+        self.offsets = offsets
+        self.counts = np.diff(np.append(offsets, len(times)))
+        self.bond = np.repeat(np.arange(len(offsets)), self.counts)
+        self.frequency = frequency[self.bond]
+
+    def subset(self, selected):
+        # flows of the selected bonds only, so converged bonds drop out of the remaining iterations
+        keep = selected[self.bond]
+        counts = self.counts[selected]
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        subset = _Flows.__new__(_Flows)
+        subset.times, subset.flows, subset.frequency = self.times[keep], self.flows[keep], self.frequency[keep]
+        subset.offsets, subset.counts = offsets, counts
+        subset.bond = np.repeat(np.arange(len(counts)), counts)
+        return subset
+
+    def derivatives(self, y, compounding='discrete', all_moments=True):
+        # price P(y) and its first two derivatives for every bond from one discount factor evaluation,
+        # plus the time weighted present value for the Macaulay duration (only P and P' when all_moments is False)
+        #   discrete:   P = sum c (1 + y/f)^(-f t),  P' = -sum c t (1 + y/f)^(-f t - 1),  P'' = sum c t (t + 1/f) (1 + y/f)^(-f t - 2)
+        #   continuous: P = sum c exp(-y t),  P' = -sum c t exp(-y t),  P'' = sum c t^2 exp(-y t)
+        y = y[self.bond]
+        if compounding == 'continuous':
+            pv = self.flows * np.exp(-y * self.times)
+            first, second = self.times, self.times ** 2
+        else:
+            growth = 1 + y / self.frequency
+            # exp of a log is much cheaper than a power with a non-integer exponent
+            pv = self.flows * np.exp(-self.frequency * self.times * np.log(growth))
+            first = self.times / growth
+            second = first * (self.times + 1 / self.frequency) / growth
+        reduce = lambda x: np.add.reduceat(x, self.offsets)
+        if not all_moments:
+            return reduce(pv), -reduce(pv * first)
+        return reduce(pv), -reduce(pv * first), reduce(pv * second), reduce(pv * self.times)
+
+def _book_flows(face, coupon_rate, maturity, frequency):
+    face, coupon_rate, frequency, maturity = np.broadcast_arrays(np.atleast_1d(np.asarray(face, dtype=np.float64)),
+                                                                 np.asarray(coupon_rate, dtype=np.float64),
+                                                                 np.asarray(frequency), np.asarray(maturity, dtype=np.float64))
+    times, flows, offsets = cash_flow_matrix(face, coupon_rate, frequency, maturity, ragged=True)
+    # coupons of zero coupon bonds (frequency 0) are ignored
+    coupon_rate = np.where(frequency > 0, coupon_rate, 0)
+    return _Flows(times, flows, offsets, np.maximum(frequency, 1).astype(np.float64)), face, coupon_rate, maturity
+
+def yield_to_maturity(price, face, coupon_rate, maturity, frequency=1, compounding='discrete', tol=1e-10,
+                      max_iterations=50, flows=None):
+    # yield of every bond in the book from its full price, by Newton's method on all bonds at once
+    # P(y) is decreasing and convex so from any starting point the iterates approach the root monotonically after at
+    # most one step; bonds leave the iteration as soon as their price is matched to within tol * price
+    # returns (yields, iterations, converged) like ImpliedVolatility.implied_volatility, with NaN yields for the bonds
+    # that did not converge
+    if flows is None:
+        flows, face, coupon_rate, maturity = _book_flows(face, coupon_rate, maturity, frequency)
+    price = np.broadcast_to(np.asarray(price, dtype=np.float64), flows.counts.shape)
+
+    # starting point from the usual approximation (annual coupon + pull to par per year) / average of price and face,
+    # which is replaced by the exact yield for bonds with a single cash flow left
+    y = (face * coupon_rate + (face - price) / maturity) / (0.5 * (face + price))
+    single = np.flatnonzero(flows.counts == 1)
+    growth = flows.flows[flows.offsets[single]] / price[single]
+    f = flows.frequency[flows.offsets[single]]
+    if compounding == 'continuous':
+        y[single] = np.log(growth) / maturity[single]
+    else:
+        y[single] = f * (growth ** (1 / (f * maturity[single])) - 1)
+    iterations = np.zeros(len(y), dtype=int)
+    converged = np.zeros(len(y), dtype=bool)
+    active = np.arange(len(y))
+    current = flows
+    # 1 + y/f must stay positive for discrete compounding
+    floor = -flows.frequency[flows.offsets] + 1e-6 if compounding != 'continuous' else -np.inf
+
+    for _ in range(max_iterations):
+        value, slope = current.derivatives(y[active], compounding, all_moments=False)
+        error = value - price[active]
+        done = np.abs(error) <= tol * price[active]
+        converged[active[done]] = True
+
+        step = error / slope
+        keep = ~done
+        next_y = y[active] - step
+        if compounding != 'continuous':
+            next_y = np.maximum(next_y, 0.5 * (y[active] + floor[active]))
+        y[active[keep]] = next_y[keep]
+        iterations[active[keep]] += 1
+
+        if done.all():
+            break
+        # the converged bonds are dropped from the flows once they are a worthwhile share of those left
+        if done.sum() > len(done) // 4:
+            selected = np.zeros(len(y), dtype=bool)
+            selected[active[keep]] = True
+            current = flows.subset(selected)
+            active = active[keep]
+
+    y[~converged] = np.nan
+    return y, iterations, converged
+
+def bond_analytics(face, coupon_rate, maturity, rate=None, price=None, frequency=1, compounding='discrete', tol=1e-10):
+    # yield, full price, Macaulay and modified duration, convexity and DV01 of every bond in the book
+    # give either the yields (rate, scalar or one per bond) or the full prices, in which case the yields are solved for
+    # bonds whose yield did not converge get NaN for every figure
+    # everything is read from one pass over the cash flows at the final yields:
+    #   Macaulay duration = sum t PV / P,  modified duration = -P'/P,  convexity = P''/P,  DV01 = -P' * 1bp
+    flows, face, coupon_rate, maturity = _book_flows(face, coupon_rate, maturity, frequency)
+    if price is not None:
+        y, _, converged = yield_to_maturity(price, face, coupon_rate, maturity, frequency, compounding, tol, flows=flows)
+    else:
+        y = np.broadcast_to(np.asarray(rate, dtype=np.float64), flows.counts.shape).copy()
+        converged = np.ones(len(y), dtype=bool)
+
+    value, slope, curvature, weighted_time = flows.derivatives(y, compounding)
+    return {'yield': y, 'price': value, 'macaulay_duration': weighted_time / value,
+            'modified_duration': -slope / value, 'convexity': curvature / value, 'dv01': -slope * BASIS_POINT,
+            'converged': converged}
+
+def benchmark_bond_analytics(num_bonds=100000):
+    rng = np.random.default_rng(0)
+    face = rng.choice([100.0, 1000.0], num_bonds)
+    coupon_rate = rng.uniform(0, 0.08, num_bonds)
+    frequency = rng.choice([0, 1, 2, 4], num_bonds)
+    maturity = rng.uniform(0.25, 30, num_bonds)
+    rate = rng.uniform(-0.005, 0.08, num_bonds)
+    price = price_bonds(face, coupon_rate, maturity, rate, frequency=frequency, ragged=True)
+
+    start = time.perf_counter()
+    analytics = bond_analytics(face, coupon_rate, maturity, price=price, frequency=frequency)
+    elapsed = time.perf_counter() - start
+    print('%d bonds: yield, durations, convexity and DV01 from prices in %.3fs' % (num_bonds, elapsed))
+    print('converged %d / %d, largest yield error %.2e'
+          % (analytics['converged'].sum(), num_bonds, np.max(np.abs(analytics['yield'] - rate))))
+
+    # DV01 against repricing with the yield bumped by one basis point either way
+    up = price_bonds(face, coupon_rate, maturity, rate + BASIS_POINT, frequency=frequency, ragged=True)
+    down = price_bonds(face, coupon_rate, maturity, rate - BASIS_POINT, frequency=frequency, ragged=True)
+    print('largest relative DV01 error against bump and reprice: %.2e'
+          % np.max(np.abs(analytics['dv01'] / ((down - up) / 2) - 1)))
+
+if __name__ == '__main__':
+    # a 3 year 10% annual coupon bond priced at 1166.51 (a 4% yield)
+    analytics = bond_analytics(1000, 0.1, 3, price=1166.51)
+    for name in ('yield', 'macaulay_duration', 'modified_duration', 'convexity', 'dv01'):
+        print('%s: %.6f' % (name, analytics[name][0]))
+    benchmark_bond_analytics()
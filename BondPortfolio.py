@@ -0,0 +1,101 @@
+import time
+import numpy as np
+
+# a bond book is a set of arrays with one entry per bond: face value, coupon rate (as a decimal), coupons per year
+# (0 for a zero coupon bond) and years to maturity
+# its cash flows are laid out once as a matrix with one row per bond, padded with zero flows at t = 0 so every row
+# has the same length, or as flat (ragged) arrays with the flows of bond i at offsets[i] ... offsets[i+1]-1
+# pricing is then a single discount factor evaluation, multiply and row sum for the whole book
+
+def _book(face, coupon_rate, frequency, maturity):
+    # a single bond can be given as scalars, it is priced as a book of one
+    face, coupon_rate, frequency, maturity = np.broadcast_arrays(np.atleast_1d(np.asarray(face, dtype=np.float64)),
+                                                                 np.asarray(coupon_rate, dtype=np.float64),
+                                                                 np.asarray(frequency), np.asarray(maturity, dtype=np.float64))
+    # number of cash flows: coupons are paid every 1/frequency years counting back from maturity, so a maturity
+    # that is not a whole number of periods starts with a short first period; zero coupon bonds have one flow
+    frequency = frequency.astype(np.int64)
+    counts = np.where(frequency > 0, np.ceil(maturity * frequency - 1e-9), 1).astype(np.int64)
+    return face, coupon_rate, frequency, maturity, np.maximum(counts, 1)
+
+def cash_flow_matrix(face, coupon_rate, frequency, maturity, ragged=False):
+    # padded: returns (times, flows), each (bonds x most cash flows), ordered by time in every row with the padding
+    #         at the start
+    # ragged: returns (times, flows, offsets), flat arrays of all the cash flows and the start of every bond's flows
+    face, coupon_rate, frequency, maturity, counts = _book(face, coupon_rate, frequency, maturity)
+    period = 1 / np.maximum(frequency, 1)
+    coupon = np.where(frequency > 0, face * coupon_rate * period, 0)
+
+    if ragged:
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        bond = np.repeat(np.arange(len(counts)), counts)
+        # periods before maturity of every flow: n-1, ..., 1, 0
+        periods_left = offsets[bond] + counts[bond] - 1 - np.arange(counts.sum())
+        times = maturity[bond] - periods_left * period[bond]
+        flows = coupon[bond] + np.where(periods_left == 0, face[bond], 0)
+        return times, flows, offsets
+
+    width = counts.max()
+    periods_left = np.arange(width - 1, -1, -1)
+    times = maturity[:, None] - periods_left * period[:, None]
+    flows = coupon[:, None] + np.where(periods_left == 0, face[:, None], 0)
+    padding = periods_left >= counts[:, None]
+    times[padding] = 0
+    flows[padding] = 0
+    return times, flows
+
+def discount_factors(times, rate=None, curve=None, frequency=1, compounding='discrete'):
+    # discount factors of cash flows at times (any shape)
+    # with a curve (any object with a vectorized discount_factor(t), e.g. a YieldCurve) rate and compounding are ignored,
+    # otherwise rate is a flat yield broadcast against times: exp(-y t) for continuous compounding,
+    # (1 + y/f)^(-f t) for discrete compounding f times a year
+    if curve is not None:
+        return curve.discount_factor(times)
+    if compounding == 'continuous':
+        return np.exp(-rate * times)
+    return (1 + rate / frequency) ** (-frequency * times)
+
+def price_bonds(face, coupon_rate, maturity, rate=None, curve=None, frequency=1, compounding='discrete', ragged=False):
+    # present value of every bond in the book from a flat yield (one for all bonds or one per bond) or a curve
+    # discrete compounding uses each bond's own coupon frequency (annual for zero coupon bonds)
+    face, coupon_rate, frequency, maturity, _ = _book(face, coupon_rate, frequency, maturity)
+    compounding_frequency = np.maximum(frequency, 1)
+    if ragged:
+        times, flows, offsets = cash_flow_matrix(face, coupon_rate, frequency, maturity, ragged=True)
+        bond = np.repeat(np.arange(len(offsets)), np.diff(np.append(offsets, len(times))))
+        rates = None if rate is None else np.broadcast_to(rate, face.shape)[bond]
+        return np.add.reduceat(flows * discount_factors(times, rates, curve, compounding_frequency[bond], compounding), offsets)
+
+    times, flows = cash_flow_matrix(face, coupon_rate, frequency, maturity)
+    rates = None if rate is None else np.broadcast_to(rate, face.shape)[:, None]
+    df = discount_factors(times, rates, curve, compounding_frequency[:, None], compounding)
+    return np.einsum('ij,ij->i', flows, df)
+
+def benchmark_price_bonds(num_bonds=50000):
+    rng = np.random.default_rng(0)
+    face = rng.choice([100.0, 1000.0], num_bonds)
+    coupon_rate = rng.uniform(0, 0.08, num_bonds)
+    frequency = rng.choice([1, 2, 4], num_bonds)
+    maturity = rng.uniform(0.25, 30, num_bonds)
+    rate = rng.uniform(0.01, 0.06, num_bonds)
+
+    for ragged in (False, True):
+        start = time.perf_counter()
+        price_bonds(face, coupon_rate, maturity, rate, frequency=frequency, ragged=ragged)
+        price_bonds(face, coupon_rate, maturity, rate, frequency=frequency, compounding='continuous', ragged=ragged)
+        print('%d bonds priced discrete and continuous (%s) in %.3fs'
+              % (num_bonds, 'ragged' if ragged else 'padded', time.perf_counter() - start))
+
+    # the same book one bond per call, as pricing one CouponBond object at a time does
+    start = time.perf_counter()
+    for i in range(2000):
+        price_bonds(face[i], coupon_rate[i], maturity[i], rate[i], frequency=frequency[i])
+    print('2000 bonds priced one call at a time in %.3fs' % (time.perf_counter() - start))
+
+if __name__ == '__main__':
+    # a 3 year 10% annual coupon bond, a 2 year zero coupon bond and a 5 year semi-annual bond at 4%
+    prices = price_bonds([1000, 1000, 1000], [0.1, 0, 0.05], [3, 2, 5], 0.04, frequency=[1, 0, 2])
+    print('Bond prices discrete:', prices.round(2))
+    prices = price_bonds([1000, 1000, 1000], [0.1, 0, 0.05], [3, 2, 5], 0.04, frequency=[1, 0, 2], compounding='continuous')
+    print('Bond prices continuous:', prices.round(2))
+    benchmark_price_bonds()
@@ -1,41 +1,66 @@
 import matplotlib.pyplot as plt
 import numpy as np
-import pandas as pd
+import StochasticProcesses
 
-# simulating 1000 r(t) interest rate processes
+# simulating 1000 r(t) interest rate processes by default
 NUM_SIMULATIONS = 1000
 NUM_POINTS = 200
+# number of paths simulated together, bounds memory at CHUNK_SIZE * NUM_POINTS floats when paths are not stored
+# (the engine's power of two, so Sobol' normals drawn chunk by chunk keep their balance)
+CHUNK_SIZE = StochasticProcesses.CHUNK_SIZE
 
-# x = principal amount
-# r0 = initial interest rate
-def monte_carlo_simulation(F, r0, kappa, theta, sigma, T=1):
-    dt = T / float(NUM_POINTS)
-    result = []
+# simulates r(t) with the exact Ornstein-Uhlenbeck transition and returns exp(-integral of r) for every path
+# when paths is given (an array of shape (num_points+1, num_simulations)) the rates are written into it
+def simulate_discount_factors(rng, num_simulations, r0, kappa, theta, sigma, T=1, num_points=NUM_POINTS,
+                              chunk_size=CHUNK_SIZE, paths=None):
+    dt = T / float(num_points)
+
+    # exact transition of the Ornstein-Uhlenbeck process over dt: r(t+dt) given r(t) is normal with
+    # mean theta + (r(t) - theta) * exp(-kappa*dt) and variance sigma^2 * (1 - exp(-2*kappa*dt)) / (2*kappa)
+    # so there is no discretization error no matter how coarse the time grid is
+    process = StochasticProcesses.Vasicek(kappa, theta, sigma)
 
-    for _ in range(NUM_SIMULATIONS):
-        # each rates array is one realization of the short-rate path: {r_0, r_dt, r_2dt, ..., r_T} (one possible future evolution of interest rates)
-        rates = [r0]
-        for _ in range(NUM_POINTS):
-            rates.append(rates[-1] + kappa * (theta - rates[-1]) * dt + sigma * np.sqrt(dt) * np.random.normal())
+    discounted = np.empty(num_simulations)
+    for start, rates in StochasticProcesses.simulate_chunks(process, r0, T, num_points, num_simulations, rng,
+                                                            chunk_size=chunk_size):
+        stop = start + len(rates)
+        # trapezoidal rule: dt * (r_0/2 + r_dt + ... + r_(T-dt) + r_T/2)
+        integral = rates[:, 1:-1].sum(axis=1) + 0.5 * (rates[:, 0] + rates[:, -1])
+        discounted[start:stop] = np.exp(-integral * dt)
+        if paths is not None:
+            paths[:, start:stop] = rates.T
 
-        result.append(rates)
+    return discounted
 
-    simulation_data = pd.DataFrame(result).T
+# F = principal amount
+# r0 = initial interest rate
+# returns (bond price, standard error of the price, rate paths) where the paths have shape
+# (num_points+1, num_simulations), one column per path, or are None when store_paths=False
+def monte_carlo_simulation(F, r0, kappa, theta, sigma, T=1, num_simulations=NUM_SIMULATIONS, num_points=NUM_POINTS,
+                           store_paths=True, chunk_size=CHUNK_SIZE, rng=None):
+    # rng can be a numpy Generator, by default the global np.random state is used
+    rng = np.random if rng is None else rng
+    paths = np.empty((num_points+1, num_simulations)) if store_paths else None
+    discounted = simulate_discount_factors(rng, num_simulations, r0, kappa, theta, sigma, T, num_points, chunk_size, paths)
 
     # price at t of zero-coupon bond maturing at T is E[exp(-integral of r_s from s=t to s=T)]
     # the expectation is taken under the risk-neutral measure
-    # we are using Monte-Carlo simulation in order to calculate this expectation
-    # using rectangles to numerically calculate integral
-    integrals_for_each_simulation = simulation_data.sum() * dt
-    discounted = np.exp(-integrals_for_each_simulation)
     bond_price = F * np.mean(discounted)
+    standard_error = F * np.std(discounted, ddof=1) / np.sqrt(num_simulations)
 
-    print('Bond price based on Monte-Carlo simulation: £%.2f' % bond_price)
-
-    return simulation_data
+    return bond_price, standard_error, paths
 
+# n independent discounted bond payoffs, the sampler interface used by ParallelMonteCarlo
+def bond_payoff_samples(rng, n, F, r0, kappa, theta, sigma, T=1, num_points=NUM_POINTS):
+    return F * simulate_discount_factors(rng, n, r0, kappa, theta, sigma, T, num_points)
 
 if __name__ == '__main__':
-    interest_rate_paths = monte_carlo_simulation(1000, 0.1, 0.3, 0.3, 0.03)
+    bond_price, standard_error, interest_rate_paths = monte_carlo_simulation(1000, 0.1, 0.3, 0.3, 0.03)
+    print('Bond price based on Monte-Carlo simulation: £%.2f (standard error £%.4f)' % (bond_price, standard_error))
+
+    # only the price is needed here so the paths are not kept
+    bond_price, standard_error, _ = monte_carlo_simulation(1000, 0.1, 0.3, 0.3, 0.03, num_simulations=1000000, store_paths=False)
+    print('Bond price with 10^6 paths: £%.4f (standard error £%.4f)' % (bond_price, standard_error))
+
     plt.plot(interest_rate_paths)
-    plt.show()
\ No newline at end of file
+    plt.show()
@@ -1,47 +1,39 @@
 import numpy as np
 import pandas as pd
-import yfinance as yf
 import matplotlib.pyplot as plt
 import scipy.optimize as optimize
+from MarketData import get_prices, load_returns
 
 RISK_FREE_RATE = 0.05
 MONTHS_IN_YEAR = 12
 
 class CAPM:
-    def __init__(self, stocks, start_date, end_date):
+    def __init__(self, stocks, start_date, end_date, store=None):
         self.data = None
         self.stocks = stocks
         self.start_date = start_date
         self.end_date = end_date
+        # MarketData.PriceStore to read prices from, None uses the shared on-disk cache
+        self.store = store
 
     def download_data(self):
-        data = {}
-        for stock in self.stocks:
-            ticker = yf.download(stock, start=self.start_date, end=self.end_date, auto_adjust=False)
-            # instead of using raw Close price, Adjusted Close takes into account any corporate actions such as dividends, stock splits etc
-            data[stock] = ticker[['Adj Close']].squeeze()
-
-        return pd.DataFrame(data)
+        # instead of using raw Close price, Adjusted Close takes into account any corporate actions such as dividends, stock splits etc
+        return get_prices(self.stocks, self.start_date, self.end_date, self.store)
     
     def initialize(self):
-        stocks_data = self.download_data()
         # we want to look at monthly returns so resample just reduces the data to the last day of each month
-        # .last() just makes it so we take the final day of the month's value to represent that month
-        stocks_data = stocks_data.resample('ME').last()
+        # and takes the final day of the month's value to represent that month
+        returns = load_returns(self.stocks[:2], self.start_date, self.end_date, self.store, resample='ME')
 
         self.data = pd.DataFrame({
-            'stock_adjclose': stocks_data[self.stocks[0]],
-            'market_adjclose': stocks_data[self.stocks[1]]
-        })
-
-        self.data[['stock_logreturns', 'market_logreturns']] = np.log(self.data / self.data.shift(1))
+            'stock_logreturns': returns.column(self.stocks[0]),
+            'market_logreturns': returns.column(self.stocks[1])
+        }, index=returns.dates)
 
         plt.figure(figsize=(10,6))
         plt.scatter(x=self.data['market_logreturns'], y=self.data['stock_logreturns'], marker='.')
         plt.show()
 
-        self.data = self.data[1:]
-
     def calculate_beta(self):
         cov_matrix = np.cov(self.data['stock_logreturns'], self.data['market_logreturns'])
         cov_stock_returns_and_market_returns = cov_matrix[0,1]
@@ -1,11 +1,15 @@
 from math import exp
+from BondPortfolio import price_bonds
 
 class CouponBond:
-    def __init__(self, principal, rate, maturity, interest_rate):
+    # single bond view of BondPortfolio.price_bonds with annual coupons, rates given in percent
+    # with a curve (e.g. YieldCurve.YieldCurve) the cash flows are discounted on it instead of at interest_rate
+    def __init__(self, principal, rate, maturity, interest_rate=None, curve=None):
         self.principal = principal          # face value of the bond
         self.rate = rate / 100              # coupon rate as a decimal
         self.maturity = maturity            # years to maturity
-        self.interest_rate = interest_rate / 100  # market interest rate as a decimal
+        self.interest_rate = None if interest_rate is None else interest_rate / 100  # market interest rate as a decimal
+        self.curve = curve
 
     def present_value(self, x, n):
         return x / (1 + self.interest_rate) ** n
@@ -14,34 +18,19 @@ class CouponBond:
         return x * exp(-self.interest_rate*t)
     
     def calculate_price_discrete(self):
-        coupon_payment = self.principal * self.rate
-        price = 0
-        
-        # Present value of coupon payments
-        for t in range(1, self.maturity + 1):
-            price += self.present_value(coupon_payment, t)
-        
-        # Present value of principal repayment
-        price += self.present_value(self.principal, self.maturity)
-        
-        return price
+        # present value of the coupon payments at t = 1, ..., maturity and of the principal repayment at maturity
+        return float(price_bonds(self.principal, self.rate, self.maturity, self.interest_rate, self.curve)[0])
 
     def calculate_price_continuous(self):
-        coupon_payment = self.principal * self.rate
-        price = 0
-        
-        # Present value of coupon payments
-        for t in range(1, self.maturity + 1):
-            price += self.present_value_continuous(coupon_payment, t)
-
-        # Present value of principal repayment
-        price += self.present_value_continuous(self.principal, self.maturity)
-
-        
-        return price
+        return float(price_bonds(self.principal, self.rate, self.maturity, self.interest_rate, self.curve,
+                                 compounding='continuous')[0])
     
 
 if __name__ == '__main__':
     bond = CouponBond(principal=1000, rate=10, maturity=3, interest_rate=4)
     print("Coupon Bond Price Discrete: %.2f" % bond.calculate_price_discrete())
-    print("Coupon Bond Price Continuous: %.2f" % bond.calculate_price_continuous())
\ No newline at end of file
+    print("Coupon Bond Price Continuous: %.2f" % bond.calculate_price_continuous())
+
+    from YieldCurve import YieldCurve, example_instruments
+    bond = CouponBond(principal=1000, rate=10, maturity=3, curve=YieldCurve(example_instruments()))
+    print("Coupon Bond Price on the zero curve: %.2f" % bond.calculate_price_discrete())
\ No newline at end of file
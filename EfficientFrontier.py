@@ -0,0 +1,68 @@
+import numpy as np
+from scipy.linalg import cho_factor, cho_solve
+
+class EfficientFrontier:
+    # closed form mean-variance frontier for N assets with mean vector m and covariance matrix C
+    # C is factorised once (Cholesky) and never inverted explicitly; with u = (1, ..., 1):
+    #   A = u'C^-1 u,  B = u'C^-1 m,  Cm = m'C^-1 m,  D = A*Cm - B^2
+    # the minimum variance portfolio with mean mu has variance (A mu^2 - 2 B mu + Cm) / D
+    # and weights ((Cm - B mu) C^-1 u + (A mu - B) C^-1 m) / D
+    def __init__(self, m, C):
+        self.m = np.asarray(m, dtype=np.float64)
+        self.C = np.asarray(C, dtype=np.float64)
+        self.factor = cho_factor(self.C)
+
+        u = np.ones(len(self.m))
+        # C^-1 u and C^-1 m from one solve with two right hand sides
+        self.C_inv_u, self.C_inv_m = cho_solve(self.factor, np.column_stack((u, self.m))).T
+        self.A = u @ self.C_inv_u
+        self.B = u @ self.C_inv_m
+        self.Cm = self.m @ self.C_inv_m
+        self.D = self.A * self.Cm - self.B ** 2
+
+    def sigma(self, mu_vals):
+        mu_vals = np.asarray(mu_vals, dtype=np.float64)
+        return np.sqrt((self.A * mu_vals ** 2 - 2 * self.B * mu_vals + self.Cm) / self.D)
+
+    def weights(self, mu_vals):
+        # (points x assets) matrix, only needed when the portfolios themselves are wanted
+        mu_vals = np.asarray(mu_vals, dtype=np.float64)[:, None]
+        return ((self.Cm - self.B * mu_vals) * self.C_inv_u + (self.A * mu_vals - self.B) * self.C_inv_m) / self.D
+
+    def frontier(self, mu_vals, return_weights=False):
+        # volatilities of the minimum variance line at every target mean, plus the weights if asked for
+        sigma_vals = self.sigma(mu_vals)
+        return (sigma_vals, self.weights(mu_vals)) if return_weights else sigma_vals
+
+    def minimum_variance_portfolio(self):
+        # returns (weights, mean, volatility)
+        return self.C_inv_u / self.A, self.B / self.A, np.sqrt(1 / self.A)
+
+    def tangency_portfolio(self, risk_free_rate):
+        # market portfolio for a risk free rate R below the MVP mean: weights proportional to C^-1 (m - R u)
+        # returns (weights, mean, volatility, Sharpe ratio)
+        direction = self.C_inv_m - risk_free_rate * self.C_inv_u
+        w = direction / (self.B - risk_free_rate * self.A)
+        mu = w @ self.m
+        sigma = np.sqrt(w @ self.C @ w)
+        return w, mu, sigma, (mu - risk_free_rate) / sigma
+
+    def capital_market_line(self, sigma_vals, risk_free_rate):
+        # means of the portfolios mixing the risk free asset with the market portfolio
+        sharpe = self.tangency_portfolio(risk_free_rate)[3]
+        return risk_free_rate + sharpe * np.asarray(sigma_vals, dtype=np.float64)
+
+if __name__ == '__main__':
+    # example 3.29 in Mathematics for Finance: An Introduction to Financial Engineering
+    m = np.array([0.1, 0.15, 0.2])
+    s1, s2, s3 = 0.28, 0.24, 0.25
+    p12, p13, p23 = -0.1, 0.25, 0.2
+    C = np.array([[s1**2, s1*s2*p12, s1*s3*p13],
+                  [s1*s2*p12, s2**2, s2*s3*p23],
+                  [s1*s3*p13, s2*s3*p23, s3**2]])
+
+    ef = EfficientFrontier(m, C)
+    w_mvp, mu_mvp, sigma_mvp = ef.minimum_variance_portfolio()
+    print('Minimum variance portfolio', w_mvp.round(4), 'mean %.4f volatility %.4f' % (mu_mvp, sigma_mvp))
+    w_market, mu_market, sigma_market, sharpe = ef.tangency_portfolio(0.12)
+    print('Market portfolio', w_market.round(4), 'mean %.4f volatility %.4f Sharpe %.4f' % (mu_market, sigma_market, sharpe))
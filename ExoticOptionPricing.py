@@ -0,0 +1,253 @@
+import time
+import numpy as np
+from scipy.special import ndtr
+from BlackScholes import call_option_price
+from MonteCarloOptionPricing import BUMP, RATE_BUMP
+
+# time steps simulated together for all paths, memory is paths * TIME_CHUNK floats for the block being walked
+# plus a few running accumulators per path, however many steps there are
+TIME_CHUNK = 16
+BARRIER_TYPES = ('down-and-out', 'up-and-out', 'down-and-in', 'up-and-in')
+
+class ExoticOptionsPricing:
+    # path dependent options on risk-neutral GBM monitored at num_steps equally spaced dates t_i = i T / num_steps
+    # the paths are walked forwards TIME_CHUNK steps at a time and only running accumulators per path are kept
+    # (sum for Asians, max/min for lookbacks, survival for barriers), so memory is O(iterations), not O(iterations x steps)
+    def __init__(self, S0, E, T, rf, sigma, num_steps, iterations):
+        self.S0 = S0
+        self.E = E
+        self.T = T
+        self.rf = rf
+        self.sigma = sigma
+        self.num_steps = num_steps
+        self.iterations = iterations
+        self.dt = T / num_steps
+
+    def _time_chunks(self, rng, time_chunk):
+        # yields (log price at the end of the previous block, block of log prices) with blocks of shape
+        # (iterations x at most time_chunk steps); the log price is a cumulative sum of normal increments
+        log_price = np.full(self.iterations, np.log(self.S0))
+        drift = (self.rf - 0.5 * self.sigma ** 2) * self.dt
+        for start in range(0, self.num_steps, time_chunk):
+            steps = min(time_chunk, self.num_steps - start)
+            block = drift + self.sigma * np.sqrt(self.dt) * rng.standard_normal((self.iterations, steps))
+            np.cumsum(block, axis=1, out=block)
+            block += log_price[:, None]
+            yield log_price, block
+            log_price = block[:, -1].copy()
+
+    def _payoff(self, x, option_type):
+        return np.maximum(x - self.E, 0) if option_type == 'call' else np.maximum(self.E - x, 0)
+
+    def geometric_asian_price(self, option_type='call'):
+        # closed form for the geometric average of the monitoring prices: log G is normal with
+        # mean log S0 + (rf - sigma^2/2) T (N+1) / (2N) and variance sigma^2 T (N+1)(2N+1) / (6N^2)
+        N = self.num_steps
+        mean = np.log(self.S0) + (self.rf - 0.5 * self.sigma ** 2) * self.T * (N + 1) / (2 * N)
+        variance = self.sigma ** 2 * self.T * (N + 1) * (2 * N + 1) / (6 * N ** 2)
+        d1 = (mean - np.log(self.E) + variance) / np.sqrt(variance)
+        d2 = d1 - np.sqrt(variance)
+        forward = np.exp(mean + 0.5 * variance)
+        if option_type == 'call':
+            return np.exp(-self.rf * self.T) * (forward * ndtr(d1) - self.E * ndtr(d2))
+        return np.exp(-self.rf * self.T) * (self.E * ndtr(-d2) - forward * ndtr(-d1))
+
+    def asian_simulation(self, option_type='call', control_variate=True, rng=None, time_chunk=TIME_CHUNK):
+        # arithmetic average price option, the average is over the num_steps monitoring dates
+        # the geometric average option on the same paths is the control variate: its price is known in closed form
+        # and its payoff is almost perfectly correlated with the arithmetic one
+        # returns (price, standard error, variance reduction factor) like OptionsPricing.variance_reduction_simulation
+        # rng can be a numpy Generator, by default the global np.random state is used
+        rng = np.random if rng is None else rng
+        arithmetic_sum = np.zeros(self.iterations)
+        log_sum = np.zeros(self.iterations)
+        for _, block in self._time_chunks(rng, time_chunk):
+            log_sum += block.sum(axis=1)
+            arithmetic_sum += np.exp(block).sum(axis=1)
+
+        discount = np.exp(-self.rf * self.T)
+        payoffs = discount * self._payoff(arithmetic_sum / self.num_steps, option_type)
+        samples = payoffs
+        if control_variate:
+            control = discount * self._payoff(np.exp(log_sum / self.num_steps), option_type)
+            covariance = np.cov(payoffs, control)
+            b = covariance[0, 1] / covariance[1, 1]
+            samples = payoffs - b * (control - self.geometric_asian_price(option_type))
+
+        variance = np.var(samples, ddof=1)
+        return np.mean(samples), np.sqrt(variance / self.iterations), np.var(payoffs, ddof=1) / variance
+
+    def lookback_simulation(self, option_type='call', floating=True, rng=None, time_chunk=TIME_CHUNK):
+        # floating strike: the call pays S_T - min S, the put max S - S_T
+        # fixed strike: the call pays max(max S - E, 0), the put max(E - min S, 0)
+        # the extremes are over the monitoring dates and S0; returns (price, standard error)
+        rng = np.random if rng is None else rng
+        maximum = np.full(self.iterations, np.log(self.S0))
+        minimum = maximum.copy()
+        for _, block in self._time_chunks(rng, time_chunk):
+            np.maximum(maximum, block.max(axis=1), out=maximum)
+            np.minimum(minimum, block.min(axis=1), out=minimum)
+            terminal = block[:, -1]
+
+        terminal, maximum, minimum = np.exp(terminal), np.exp(maximum), np.exp(minimum)
+        if floating:
+            payoffs = terminal - minimum if option_type == 'call' else maximum - terminal
+        else:
+            payoffs = self._payoff(maximum if option_type == 'call' else minimum, option_type)
+        payoffs = np.exp(-self.rf * self.T) * payoffs
+        return np.mean(payoffs), np.std(payoffs, ddof=1) / np.sqrt(self.iterations)
+
+    def barrier_simulation(self, barrier, barrier_type='down-and-out', option_type='call', bridge_correction=True,
+                           rng=None, time_chunk=TIME_CHUNK):
+        # knock-out options pay the vanilla payoff if the barrier is never touched, knock-in options only if it is
+        # without the correction the barrier is only checked at the monitoring dates (a discretely monitored barrier);
+        # with it the price is that of a continuously monitored barrier: between two dates the log price is a Brownian
+        # bridge, which stays on the safe side of the barrier b with probability 1 - exp(-2 (b - x_i)(b - x_i+1) / (sigma^2 dt)),
+        # and each path carries the product of these probabilities instead of a 0/1 knocked out flag
+        # returns (price, standard error)
+        if barrier_type not in BARRIER_TYPES:
+            raise ValueError('unknown barrier type %r' % barrier_type)
+        rng = np.random if rng is None else rng
+        log_barrier, side = np.log(barrier), -1.0 if barrier_type.startswith('up') else 1.0
+        survival = self._initial_survival(self.S0, log_barrier, side)
+
+        for previous, block in self._time_chunks(rng, time_chunk):
+            self._update_survival(survival, previous, block, log_barrier, side, self.sigma, bridge_correction)
+            terminal = block[:, -1]
+
+        payoffs = np.exp(-self.rf * self.T) * self._payoff(np.exp(terminal), option_type)
+        payoffs *= survival if barrier_type.endswith('out') else 1 - survival
+        return np.mean(payoffs), np.std(payoffs, ddof=1) / np.sqrt(self.iterations)
+
+    def _initial_survival(self, S0, log_barrier, side):
+        # side is 1 for down barriers and -1 for up barriers, so side * (log S - log barrier) is the distance to the
+        # barrier on its safe side, negative once it has been crossed
+        return np.full(self.iterations, 1.0 if side * (np.log(S0) - log_barrier) > 0 else 0.0)
+
+    def _update_survival(self, survival, previous, block, log_barrier, side, sigma, bridge_correction):
+        distance = side * (block - log_barrier)
+        survival *= np.all(distance > 0, axis=1)
+        if bridge_correction:
+            before = np.concatenate((side * (previous[:, None] - log_barrier), distance[:, :-1]), axis=1)
+            crossing = np.exp(-2 * np.maximum(before, 0) * np.maximum(distance, 0) / (sigma ** 2 * self.dt))
+            survival *= np.prod(1 - crossing, axis=1)
+
+    def barrier_greeks(self, barrier, barrier_type='down-and-out', option_type='call', method='likelihood_ratio',
+                       bridge_correction=False, rng=None, time_chunk=TIME_CHUNK, bump=BUMP, rate_bump=RATE_BUMP):
+        # price, delta, gamma, vega and rho of a barrier option from one walk over the paths
+        #   'likelihood_ratio' - knocking out makes the payoff jump with the path, so rather than differentiating it
+        #                        the payoff is weighted by scores of the path density: S0 only moves the first step
+        #                        (delta and gamma weights in z_1), sigma and r move every step (vega weight
+        #                        sum (z_i^2 - 1)/sigma - z_i sqrt(dt), rho weight sum z_i sqrt(dt)/sigma - T);
+        #                        discrete monitoring only, the bridge corrected survival depends on S0 and sigma directly
+        #                        and the gamma and vega weights get noisier as the grid gets finer
+        #   'bump'             - central differences with common random numbers: the same Brownian paths are revalued
+        #                        with S0, sigma or r bumped in the same pass; with the bridge correction the payoff
+        #                        is smooth in the parameters and the differences are far less noisy
+        # returns (greeks, standard errors) like OptionsPricing.greeks_simulation
+        if barrier_type not in BARRIER_TYPES:
+            raise ValueError('unknown barrier type %r' % barrier_type)
+        if method == 'likelihood_ratio' and bridge_correction:
+            raise ValueError('likelihood ratio barrier Greeks need a discretely monitored barrier, use bump')
+        if method not in ('likelihood_ratio', 'bump'):
+            raise ValueError('unknown Greek method %r' % method)
+        rng = np.random if rng is None else rng
+        log_barrier, side = np.log(barrier), -1.0 if barrier_type.startswith('up') else 1.0
+        knock_out = barrier_type.endswith('out')
+        S0, rf, sigma, dt = self.S0, self.rf, self.sigma, self.dt
+
+        if method == 'likelihood_ratio':
+            survival = self._initial_survival(S0, log_barrier, side)
+            sum_z, sum_z2, first = np.zeros(self.iterations), np.zeros(self.iterations), None
+            for previous, block in self._time_chunks(rng, time_chunk):
+                # the normals behind the block, recovered from its log price increments
+                z = (np.diff(block, axis=1, prepend=previous[:, None]) - (rf - 0.5 * sigma ** 2) * dt) / (sigma * np.sqrt(dt))
+                if first is None:
+                    first = z[:, 0].copy()
+                sum_z += z.sum(axis=1)
+                sum_z2 += (z * z).sum(axis=1)
+                self._update_survival(survival, previous, block, log_barrier, side, sigma, False)
+                terminal = block[:, -1]
+
+            prices = np.exp(-rf * self.T) * self._payoff(np.exp(terminal), option_type)
+            prices *= survival if knock_out else 1 - survival
+            samples = {'price': prices,
+                       'delta': prices * first / (S0 * sigma * np.sqrt(dt)),
+                       'gamma': prices * ((first ** 2 - 1) / (sigma ** 2 * dt) - first / (sigma * np.sqrt(dt))) / S0 ** 2,
+                       'vega': prices * ((sum_z2 - self.num_steps) / sigma - sum_z * np.sqrt(dt)),
+                       'rho': prices * (sum_z * np.sqrt(dt) / sigma - self.T)}
+        else:
+            h = bump * S0
+            # (S0, rf, sigma) of the base case and the six bumped ones
+            scenarios = [(S0, rf, sigma), (S0 + h, rf, sigma), (S0 - h, rf, sigma), (S0, rf, sigma * (1 + bump)),
+                         (S0, rf, sigma * (1 - bump)), (S0, rf + rate_bump, sigma), (S0, rf - rate_bump, sigma)]
+            survival = [self._initial_survival(s, log_barrier, side) for s, _, _ in scenarios]
+            terminal = [None] * len(scenarios)
+            step = 0
+            for previous, block in self._time_chunks(rng, time_chunk):
+                times = dt * np.arange(step, step + block.shape[1] + 1)
+                # sigma W_t at the end of the previous block and along this one, shared by every scenario
+                noise = np.concatenate((previous[:, None], block), axis=1) - np.log(S0) - (rf - 0.5 * sigma ** 2) * times
+                for k, (s, r, v) in enumerate(scenarios):
+                    path = np.log(s) + (r - 0.5 * v ** 2) * times + v / sigma * noise
+                    self._update_survival(survival[k], path[:, 0], path[:, 1:], log_barrier, side, v, bridge_correction)
+                    terminal[k] = path[:, -1]
+                step += block.shape[1]
+
+            values = [np.exp(-r * self.T) * self._payoff(np.exp(x), option_type) * (p if knock_out else 1 - p)
+                      for (_, r, _), x, p in zip(scenarios, terminal, survival)]
+            prices = values[0]
+            samples = {'price': prices,
+                       'delta': (values[1] - values[2]) / (2 * h),
+                       'gamma': (values[1] - 2 * prices + values[2]) / h ** 2,
+                       'vega': (values[3] - values[4]) / (2 * bump * sigma),
+                       'rho': (values[5] - values[6]) / (2 * rate_bump)}
+
+        greeks = {name: np.mean(x) for name, x in samples.items()}
+        std_errors = {name: np.std(x, ddof=1) / np.sqrt(self.iterations) for name, x in samples.items()}
+        return greeks, std_errors
+
+def down_and_out_call_price(S, E, T, rf, sigma, barrier):
+    # continuously monitored down-and-out call with the barrier below the strike (Merton, Reiner and Rubinstein)
+    # the knock-in part is the vanilla call reflected in the barrier
+    lam = (rf + 0.5 * sigma ** 2) / sigma ** 2
+    y = np.log(barrier ** 2 / (S * E)) / (sigma * np.sqrt(T)) + lam * sigma * np.sqrt(T)
+    knock_in = (S * (barrier / S) ** (2 * lam) * ndtr(y)
+                - E * np.exp(-rf * T) * (barrier / S) ** (2 * lam - 2) * ndtr(y - sigma * np.sqrt(T)))
+    return call_option_price(S, E, T, rf, sigma) - knock_in
+
+def benchmark_exotics(iterations=10**5, num_steps=2520):
+    # ten years of daily monitoring; memory stays at iterations * TIME_CHUNK floats plus the accumulators
+    rng = np.random.default_rng(0)
+    pricer = ExoticOptionsPricing(100, 100, 10, 0.03, 0.2, num_steps, iterations)
+
+    start = time.perf_counter()
+    price, std_error, factor = pricer.asian_simulation('call', rng=rng)
+    print('Asian call %d paths x %d steps: %.4f +- %.4f (control variate reduces the variance %.0fx) in %.2fs'
+          % (iterations, num_steps, price, std_error, factor, time.perf_counter() - start))
+
+    start = time.perf_counter()
+    price, std_error = pricer.lookback_simulation('call', rng=rng)
+    print('Floating strike lookback call: %.4f +- %.4f in %.2fs' % (price, std_error, time.perf_counter() - start))
+
+    # barrier correction against the continuous monitoring closed form, on a coarse grid where the bias shows
+    coarse = ExoticOptionsPricing(100, 100, 1, 0.05, 0.2, 50, iterations)
+    exact = down_and_out_call_price(100, 100, 1, 0.05, 0.2, 90)
+    for correction in (False, True):
+        start = time.perf_counter()
+        price, std_error = coarse.barrier_simulation(90, 'down-and-out', 'call', correction, rng)
+        print('Down-and-out call, 50 dates, bridge correction %-5s: %.4f +- %.4f (continuous closed form %.4f) in %.2fs'
+              % (correction, price, std_error, exact, time.perf_counter() - start))
+
+    # Greeks of the same barrier: likelihood ratio on the discrete barrier, common random numbers on the corrected one
+    for method, correction in (('likelihood_ratio', False), ('bump', True)):
+        start = time.perf_counter()
+        greeks, std_errors = coarse.barrier_greeks(90, 'down-and-out', 'call', method, correction, rng)
+        print('Down-and-out call Greeks (%s, bridge correction %s) in %.2fs: ' % (method, correction, time.perf_counter() - start)
+              + '  '.join('%s %.4f +- %.4f' % (name, greeks[name], std_errors[name]) for name in ('delta', 'gamma', 'vega', 'rho')))
+
+if __name__ == '__main__':
+    pricer = ExoticOptionsPricing(100, 100, 1, 0.05, 0.2, 252, 100000)
+    print('Geometric Asian call (closed form): %.4f' % pricer.geometric_asian_price())
+    print('Arithmetic Asian call: %.4f +- %.4f, variance reduction %.0fx' % pricer.asian_simulation())
+    benchmark_exotics()
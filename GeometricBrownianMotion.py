@@ -1,20 +1,17 @@
 import matplotlib.pyplot as plt
 import numpy as np
+import StochasticProcesses
 
 # S0 is start value of stock
-def simulate_geometric_random_walk(S0, T=2, N=100, mu=0.1, sigma=0.5):
-    dt = T/N
-    t = np.linspace(0, T, N+1)
+# with num_paths given S has shape (num_paths, N+1), one row per path
+# rng can be a numpy Generator or QuasiMonteCarlo.SobolNormals, by default the global np.random state is used
+def simulate_geometric_random_walk(S0, T=2, N=100, mu=0.1, sigma=0.5, num_paths=None, rng=None):
+    # d(log(S(t))) = (mu - 0.5 * s^2) * dt + s * dW, simulated exactly by StochasticProcesses
+    # W(t+dt) - W(t) follows N(0, dt) distribution
+    process = StochasticProcesses.GeometricBrownianMotion(mu, sigma)
+    t, S = StochasticProcesses.simulate(process, S0, T, N, 1 if num_paths is None else num_paths, rng)
 
-    # W(t+dt) - W(t) follows N(0, dt^2) distribution
-    W = np.zeros(N+1)
-    W[1:N+1] = np.cumsum(np.sqrt(dt) * np.random.standard_normal(size=N))
-
-    # d(log(S(t))) = (mu - 0.5 * s^2) * dt + s * dW
-    X = (mu - 0.5 * sigma ** 2) * t + sigma * W
-    S = S0 * np.exp(X)
-
-    return t, S
+    return t, S[0] if num_paths is None else S
 
 def plot_simulation(t, S):
     plt.plot(t, S)
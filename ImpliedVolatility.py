@@ -0,0 +1,116 @@
+import time
+import numpy as np
+from scipy.optimize import brentq
+from BlackScholes import call_option_price, put_option_price, _is_call
+
+MIN_VOLATILITY = 1e-4
+MAX_VOLATILITY = 5.0
+
+def _initial_guess(C, S, discounted_strike, tau):
+    # Corrado-Miller rational approximation for the implied volatility of a call
+    # accurate near the money, and always clipped into the bracket afterwards
+    forward_gap = S - discounted_strike
+    excess = C - forward_gap / 2
+    radicand = np.maximum(excess ** 2 - forward_gap ** 2 / np.pi, 0)
+    guess = np.sqrt(2 * np.pi / tau) / (S + discounted_strike) * (excess + np.sqrt(radicand))
+    return np.clip(np.nan_to_num(guess, nan=0.2), MIN_VOLATILITY, MAX_VOLATILITY)
+
+def implied_volatility(price, S, E, T, rf, option_type='call', t=0, tol=1e-8, max_iterations=100):
+    # batch implied volatility: returns (sigma, iterations, converged) with one entry per quote
+    price, S, E, T, rf, t, is_call = np.broadcast_arrays(
+        *(np.asarray(x, dtype=np.float64) for x in (price, S, E, T, rf, t)), _is_call(option_type))
+    shape = price.shape
+    price, S, E, T, rf, t, is_call = (x.ravel() for x in (price, S, E, T, rf, t, is_call))
+
+    tau = T - t
+    discounted_strike = E * np.exp(-rf * tau)
+    # put-call parity turns every put quote into an equivalent call quote, so only calls are priced below
+    C = np.where(is_call, price, price + S - discounted_strike)
+
+    sigma = np.full(C.shape, np.nan)
+    iterations = np.zeros(C.shape, dtype=np.int64)
+    converged = np.zeros(C.shape, dtype=bool)
+
+    # quotes outside the no-arbitrage bounds max(S - E*exp(-rf*tau), 0) < C < S have no implied volatility
+    valid = (tau > 0) & (C > np.maximum(S - discounted_strike, 0)) & (C < S)
+    lower = np.full(C.shape, MIN_VOLATILITY)
+    upper = np.full(C.shape, MAX_VOLATILITY)
+    sigma[valid] = _initial_guess(C[valid], S[valid], discounted_strike[valid], tau[valid])
+
+    # indices of the rows still being solved, converged rows drop out and stop costing work
+    active = np.flatnonzero(valid)
+    for _ in range(max_iterations):
+        if active.size == 0:
+            break
+        s, a_S, a_E, a_rf, a_tau = sigma[active], S[active], E[active], rf[active], tau[active]
+
+        diff = call_option_price(a_S, a_E, a_tau, a_rf, s) - C[active]
+        d1 = (np.log(a_S/a_E) + (a_rf + 0.5 * s ** 2) * a_tau) / (s * np.sqrt(a_tau))
+        vega = a_S * np.exp(-0.5 * d1 ** 2) / np.sqrt(2 * np.pi) * np.sqrt(a_tau)
+        iterations[active] += 1
+
+        # the call price is increasing in sigma so the sign of the error tells us which side of the root we are on
+        too_high = diff > 0
+        upper[active] = np.where(too_high, s, upper[active])
+        lower[active] = np.where(too_high, lower[active], s)
+
+        done = np.abs(diff) < tol * np.maximum(a_S, 1)
+        converged[active[done]] = True
+
+        # safeguarded Newton: fall back to bisection whenever the Newton step leaves the current bracket
+        with np.errstate(divide='ignore', invalid='ignore'):
+            newton = s - diff / vega
+        lo, hi = lower[active], upper[active]
+        inside = np.isfinite(newton) & (newton > lo) & (newton < hi)
+        sigma[active] = np.where(done, s, np.where(inside, newton, 0.5 * (lo + hi)))
+
+        # a collapsed bracket also means we have found the root to machine precision, but only if both ends were
+        # moved off MIN_VOLATILITY and MAX_VOLATILITY; a bracket squeezed onto one of them means the root is outside
+        # and the row is left unconverged
+        collapsed = (hi - lo) < tol
+        converged[active[collapsed & (lo > MIN_VOLATILITY) & (hi < MAX_VOLATILITY)]] = True
+        active = active[~(done | collapsed)]
+
+    sigma[~converged] = np.nan
+    return sigma.reshape(shape), iterations.reshape(shape), converged.reshape(shape)
+
+def implied_volatility_brentq(price, S, E, T, rf, option_type='call', t=0):
+    # per-quote scalar root-finding, used as the reference for the benchmark
+    pricer = call_option_price if option_type == 'call' else put_option_price
+    try:
+        return brentq(lambda sigma: pricer(S, E, T, rf, sigma, t) - price, MIN_VOLATILITY, MAX_VOLATILITY)
+    except ValueError:
+        # no sign change in the bracket, e.g. the quote is indistinguishable from intrinsic value
+        return np.nan
+
+def benchmark_implied_volatility(num_quotes=200000, num_brentq=2000):
+    rng = np.random.default_rng(0)
+    S = np.full(num_quotes, 100.0)
+    E = rng.uniform(70, 130, num_quotes)
+    T = rng.uniform(0.05, 2, num_quotes)
+    rf = np.full(num_quotes, 0.03)
+    true_sigma = rng.uniform(0.1, 0.8, num_quotes)
+    prices = call_option_price(S, E, T, rf, true_sigma)
+
+    start = time.perf_counter()
+    sigma, iterations, converged = implied_volatility(prices, S, E, T, rf)
+    vectorized_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for i in range(num_brentq):
+        implied_volatility_brentq(prices[i], S[i], E[i], T[i], rf[i])
+    brentq_time = (time.perf_counter() - start) * num_quotes / num_brentq
+
+    print('Vectorized: %.0f quotes/s, mean iterations %.2f, failures %d' % (num_quotes / vectorized_time, iterations.mean(), np.sum(~converged)))
+    print('brentq loop: %.0f quotes/s (extrapolated from %d quotes)' % (num_quotes / brentq_time, num_brentq))
+    # repricing error rather than volatility error: deep in-the-money quotes have almost no vega
+    # so many volatilities reproduce the same price to within the tolerance
+    repricing_error = np.abs(call_option_price(S, E, T, rf, sigma) - prices)
+    print('Speed-up: %.0fx, max repricing error %.2e' % (brentq_time / vectorized_time, np.nanmax(repricing_error)))
+
+if __name__ == '__main__':
+    price = call_option_price(100, 100, 1, 0.05, 0.2)
+    sigma, iterations, converged = implied_volatility(price, 100, 100, 1, 0.05)
+    print('Implied volatility of a £%.2f call: %.4f after %d iterations' % (price, sigma, iterations))
+
+    benchmark_implied_volatility()
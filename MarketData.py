@@ -0,0 +1,197 @@
+import os
+import re
+import json
+import datetime
+import warnings
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+
+# adjusted close prices are cached per ticker in this directory as memory-mapped NumPy arrays
+CACHE_DIR = os.environ.get('MARKET_DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'market_data'))
+# with MARKET_DATA_OFFLINE=1 nothing is downloaded and everything is served from the cache
+OFFLINE = os.environ.get('MARKET_DATA_OFFLINE', '0') not in ('', '0')
+# tickers are fetched concurrently by at most this many threads
+MAX_WORKERS = 8
+
+def _to_day(date):
+    return np.datetime64(pd.Timestamp(date).date(), 'D')
+
+def _to_series(prices, ticker):
+    # every source hands back adjusted close prices on a timezone-naive daily DatetimeIndex
+    prices = prices.squeeze() if isinstance(prices, pd.DataFrame) else prices
+    prices = pd.Series(prices, dtype=np.float64).dropna()
+    index = pd.DatetimeIndex(prices.index)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    prices.index = index.normalize().rename('Date')
+    return prices.rename(ticker)
+
+class YahooSource:
+    def fetch(self, ticker, start, end):
+        # imported here so cached and offline runs do not need yfinance at all
+        import yfinance as yf
+        # Ticker.history rather than yf.download, which shares global state between calls and is not thread safe
+        data = yf.Ticker(ticker).history(start=start, end=end, auto_adjust=False)
+        # instead of using raw Close price, Adjusted Close takes into account any corporate actions such as dividends, stock splits etc
+        return _to_series(data['Adj Close'] if len(data) else pd.Series(dtype=np.float64), ticker)
+
+class CSVSource:
+    # local stand-in for Yahoo: one <ticker>.csv file per ticker with a Date column and an Adj Close (or Close) column
+    def __init__(self, directory):
+        self.directory = directory
+
+    def fetch(self, ticker, start, end):
+        data = pd.read_csv(os.path.join(self.directory, ticker + '.csv'), index_col='Date', parse_dates=True)
+        prices = _to_series(data['Adj Close'] if 'Adj Close' in data else data['Close'], ticker)
+        return prices[(prices.index >= pd.Timestamp(start)) & (prices.index < pd.Timestamp(end))]
+
+class PriceStore:
+    # on-disk store of adjusted close prices: for every ticker it keeps the dates, the prices and the date
+    # ranges that have already been requested from the source, so only missing ranges are ever downloaded
+    # (weekends and holidays inside a covered range are known to have no data and are not asked for again)
+    def __init__(self, directory=CACHE_DIR, source=None, offline=OFFLINE):
+        self.directory = directory
+        self.source = YahooSource() if source is None else source
+        self.offline = offline
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, ticker, kind):
+        return os.path.join(self.directory, re.sub(r'[^A-Za-z0-9._^=-]', '_', ticker) + '.' + kind)
+
+    def _load(self, ticker):
+        if not os.path.exists(self._path(ticker, 'json')):
+            return np.empty(0, dtype='datetime64[D]'), np.empty(0), []
+        with open(self._path(ticker, 'json')) as file:
+            covered = [(np.datetime64(start), np.datetime64(end)) for start, end in json.load(file)['covered']]
+        dates = np.load(self._path(ticker, 'dates.npy'), mmap_mode='r')
+        prices = np.load(self._path(ticker, 'prices.npy'), mmap_mode='r')
+        return dates, prices, covered
+
+    def _save(self, ticker, dates, prices, covered):
+        # write to temporary files and rename so a crash never leaves a half written cache behind
+        for kind, array in (('dates.npy', dates), ('prices.npy', prices)):
+            with open(self._path(ticker, kind) + '.tmp', 'wb') as file:
+                np.save(file, array)
+            os.replace(self._path(ticker, kind) + '.tmp', self._path(ticker, kind))
+        with open(self._path(ticker, 'json') + '.tmp', 'w') as file:
+            json.dump({'covered': [[str(start), str(end)] for start, end in covered]}, file)
+        os.replace(self._path(ticker, 'json') + '.tmp', self._path(ticker, 'json'))
+
+    @staticmethod
+    def _missing(start, end, covered):
+        # parts of [start, end) not inside any covered range
+        missing = []
+        for covered_start, covered_end in covered:
+            if covered_start > start:
+                missing.append((start, min(covered_start, end)))
+            start = max(start, covered_end)
+            if start >= end:
+                return missing
+        return missing + [(start, end)] if start < end else missing
+
+    @staticmethod
+    def _merge(ranges):
+        merged = []
+        for start, end in sorted(ranges):
+            if merged and start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+    def get_series(self, ticker, start, end):
+        # adjusted close prices of one ticker for dates in [start, end)
+        start, end = _to_day(start), _to_day(end)
+        dates, prices, covered = self._load(ticker)
+        # today's bar may still change and future dates have no data yet, so they are never marked as covered
+        today = np.datetime64(datetime.date.today(), 'D')
+        missing = [(s, e) for s, e in self._missing(start, min(end, today), covered) if s < e]
+        if end > today:
+            missing.append((max(start, today), end))
+
+        if missing and self.offline:
+            if not covered:
+                raise LookupError('%s is not in the market data cache and offline mode is on' % ticker)
+            warnings.warn('serving %s from the cache, %d date ranges are missing' % (ticker, len(missing)))
+        elif missing:
+            fetched = [self.source.fetch(ticker, str(s), str(e)) for s, e in missing]
+            new_dates = np.concatenate([np.asarray(f.index.values, dtype='datetime64[D]') for f in fetched])
+            new_prices = np.concatenate([f.to_numpy() for f in fetched])
+            # newly downloaded prices win over cached ones for the same date
+            all_dates = np.concatenate((new_dates, dates))
+            all_prices = np.concatenate((new_prices, prices))
+            all_dates, first = np.unique(all_dates, return_index=True)
+            dates, prices = all_dates, all_prices[first]
+            covered = self._merge(covered + [(s, min(e, today)) for s, e in missing if s < min(e, today)])
+            self._save(ticker, dates, prices, covered)
+
+        selected = (dates >= start) & (dates < end)
+        index = pd.DatetimeIndex(np.asarray(dates[selected], dtype='datetime64[ns]'), name='Date')
+        return pd.Series(np.asarray(prices[selected]), index=index, name=ticker)
+
+    def get_prices(self, tickers, start, end, max_workers=MAX_WORKERS):
+        # adjusted close prices as a DataFrame with one column per ticker
+        # every ticker has its own cache files so they can safely be fetched on separate threads
+        tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(tickers)))) as pool:
+            series = list(pool.map(lambda ticker: self.get_series(ticker, start, end), tickers))
+        return pd.DataFrame(dict(zip(tickers, series)))
+
+class ReturnsMatrix:
+    # log returns of several tickers on one common calendar
+    # values is a C-contiguous float64 array of shape (dates, tickers), column j belongs to tickers[j]
+    def __init__(self, values, tickers, dates):
+        self.values = values
+        self.tickers = tickers
+        self.dates = dates
+
+    def frame(self):
+        # pandas view of the same returns for the code that works with DataFrames
+        return pd.DataFrame(self.values, index=self.dates, columns=self.tickers, copy=False)
+
+    def column(self, ticker):
+        return self.values[:, self.tickers.index(ticker)]
+
+_default_store = None
+
+def _store(store):
+    global _default_store
+    if store is None:
+        if _default_store is None:
+            _default_store = PriceStore()
+        store = _default_store
+    return store
+
+def get_prices(tickers, start, end, store=None):
+    # every download_data in the project reads through here, pass store to use another cache directory or source
+    return _store(store).get_prices(tickers, start, end)
+
+def load_returns(tickers, start, end, store=None, missing='drop', resample=None, max_workers=MAX_WORKERS):
+    # fetches all tickers concurrently, aligns them on a common calendar and returns their log returns
+    # missing decides what happens on dates where some tickers have no price:
+    #   'drop'  - keep only the dates on which every ticker traded
+    #   'ffill' - keep every date, carrying the last price forward (a zero return) and dropping the leading
+    #             dates before every ticker has started trading
+    #   'raise' - the calendars must match exactly
+    # resample e.g. 'ME' keeps the last price of each month before taking returns
+    tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+    prices = _store(store).get_prices(tickers, start, end, max_workers)
+
+    if missing == 'drop':
+        prices = prices.dropna()
+    elif missing == 'ffill':
+        prices = prices.ffill().dropna()
+    elif missing == 'raise':
+        if prices.isna().to_numpy().any():
+            raise ValueError('tickers do not share the same trading calendar')
+    else:
+        raise ValueError('unknown missing data policy %r' % missing)
+
+    if resample is not None:
+        prices = prices.resample(resample).last().dropna()
+
+    values = np.log(prices.to_numpy(dtype=np.float64))
+    # log(P_t / P_t-1) as a difference of logs, written straight into a new contiguous array
+    returns = np.ascontiguousarray(np.diff(values, axis=0))
+    return ReturnsMatrix(returns, tickers, prices.index[1:])
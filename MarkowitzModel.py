@@ -1,14 +1,18 @@
+import time
 import numpy as np
 import pandas as pd
-import yfinance as yf
 import matplotlib.pyplot as plt
 import scipy.optimize as optimization
+from scipy.linalg import cho_factor, cho_solve
+from MarketData import get_prices, load_returns
 
 # on average there are 252 trading days in a year
 NUM_TRADING_DAYS = 252
 
 # number of portfolios to simulate
 NUM_PORTFOLIOS = 10000
+# number of portfolios evaluated together, bounds memory at CHUNK_SIZE * number of assets
+CHUNK_SIZE = 100000
 
 # stocks we are going to handle
 tickers = ['AAPL', 'WMT', 'TSLA', 'GE', 'AMZN', 'DB']
@@ -16,16 +20,14 @@ tickers = ['AAPL', 'WMT', 'TSLA', 'GE', 'AMZN', 'DB']
 start_date = '2020-01-01'
 end_date = '2025-01-04'
 
-def download_data():
-    stock_data = {}
-
-    for ticker in tickers:
-        ticker_data = yf.Ticker(ticker)
-        ticker_price_history = ticker_data.history(start=start_date, end=end_date)['Close']
-        stock_data[ticker] = ticker_price_history
-
+def download_data(store=None):
+    # adjusted close prices read through the shared on-disk cache (MarketData.PriceStore)
     # structure is {'AAPL': [apple prices], 'MSFT': [microsoft prices], ...}
-    return pd.DataFrame(stock_data)
+    return get_prices(tickers, start_date, end_date, store)
+
+def load_log_returns(store=None):
+    # the same log returns as calculate_returns(download_data()), fetched concurrently and aligned in one step
+    return load_returns(tickers, start_date, end_date, store).frame()
 
 def show_data(data):
     data.plot(figsize=(10, 6))
@@ -54,20 +56,60 @@ def show_mean_variance_of_portfolio(returns, weights):
     print("Expected portfolio mean (return): ", portfolio_expected_annual_return)
     print("Annualised portfolio standard deviation (volatility): ", portfolio_annualised_volatility)
 
-def generate_portfolios(returns):
-    portfolio_means = []
-    portfolio_risks = []
-    portfolio_weights = []
+def annualised_moments(returns):
+    # annualised mean vector and covariance matrix of the daily returns (a DataFrame or a (days x assets) array)
+    # same values as returns.mean() and returns.cov() times NUM_TRADING_DAYS, but computed once and reused
+    values = np.asarray(returns, dtype=np.float64)
+    return values.mean(axis=0) * NUM_TRADING_DAYS, np.cov(values, rowvar=False) * NUM_TRADING_DAYS
+
+def evaluate_portfolios(weights, mean, cov):
+    # means, volatilities and Sharpe ratios of every row of a (portfolios x assets) weights matrix in one pass
+    # the variance of row w is w @ cov @ w, i.e. the row sums of (W @ C) * W
+    portfolio_means = weights @ mean
+    portfolio_risks = np.sqrt(np.einsum('ij,ij->i', weights @ cov, weights))
+    return portfolio_means, portfolio_risks, portfolio_means / portfolio_risks
+
+def generate_portfolios(returns, num_portfolios=NUM_PORTFOLIOS, chunk_size=CHUNK_SIZE, store_weights=True, rng=None):
+    # rng can be a numpy Generator, by default the global np.random state is used
+    # with store_weights=False the weights are not kept (None is returned for them) so memory is O(num_portfolios)
+    rng = np.random if rng is None else rng
+    mean, cov = annualised_moments(returns)
+    num_assets = len(mean)
+
+    portfolio_weights = np.empty((num_portfolios, num_assets)) if store_weights else None
+    portfolio_means = np.empty(num_portfolios)
+    portfolio_risks = np.empty(num_portfolios)
 
+    for start in range(0, num_portfolios, chunk_size):
+        stop = min(start + chunk_size, num_portfolios)
+        weights = rng.random((stop - start, num_assets)) # e.g. [0.5, 0.7, 0.2, 0.1, 0.9, 0.8] in each row
+        weights /= weights.sum(axis=1, keepdims=True) # normalise to sum 1 to get [0.15625, 0.21875, 0.0625, 0.03125, 0.28125, 0.25]
+        portfolio_means[start:stop], portfolio_risks[start:stop], _ = evaluate_portfolios(weights, mean, cov)
+        if store_weights:
+            portfolio_weights[start:stop] = weights
 
-    for _ in range(NUM_PORTFOLIOS):
-        weights = np.random.rand(len(tickers)) # e.g. [0.5, 0.7, 0.2, 0.1, 0.9, 0.8]
-        weights /= np.sum(weights) # normalise to sum 1 to get [0.15625, 0.21875, 0.0625, 0.03125, 0.28125, 0.25]
-        portfolio_weights.append(weights)
-        portfolio_means.append(np.sum(returns.mean() * weights) * NUM_TRADING_DAYS)
-        portfolio_risks.append(np.sqrt(np.dot(weights.T, np.dot(returns.cov(), weights)) * NUM_TRADING_DAYS))
+    return portfolio_weights, portfolio_means, portfolio_risks
 
-    return np.array(portfolio_weights), np.array(portfolio_means), np.array(portfolio_risks)
+def benchmark_generate_portfolios(num_days=1250, num_assets=6, num_portfolios=1000000, num_loop=2000):
+    # vectorized engine against the original one portfolio at a time loop on synthetic returns
+    rng = np.random.default_rng(0)
+    returns = pd.DataFrame(rng.normal(0.0005, 0.02, (num_days, num_assets)))
+
+    start = time.perf_counter()
+    generate_portfolios(returns, num_portfolios, store_weights=False, rng=rng)
+    vectorized_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(num_loop):
+        weights = rng.random(num_assets)
+        weights /= np.sum(weights)
+        np.sum(returns.mean() * weights) * NUM_TRADING_DAYS
+        np.sqrt(np.dot(weights.T, np.dot(returns.cov(), weights)) * NUM_TRADING_DAYS)
+    loop_time = (time.perf_counter() - start) * num_portfolios / num_loop
+
+    print('Vectorized: %.0f portfolios/s' % (num_portfolios / vectorized_time))
+    print('Loop: %.0f portfolios/s (extrapolated from %d portfolios)' % (num_portfolios / loop_time, num_loop))
+    print('Speed-up: %.0fx' % (loop_time / vectorized_time))
 
 def show_portfolios(returns_means, returns_volatilities):
     plt.figure(figsize = (10,6))
@@ -87,12 +129,116 @@ def statistics(weights, returns):
 def min_function_sharpe(weights, returns):
     return -statistics(weights, returns)[2]
 
+class SharpeOptimizer:
+    # maximises the Sharpe ratio with the annualised mean and covariance computed once up front
+    # a problem is (risk_free_rate, bounds, assets):
+    #   bounds is None (short selling allowed), one (low, high) pair for every weight, or a pair per asset
+    #   assets is None for the whole universe or a list of column indices to optimise over
+    # x0 is an optional starting point for the numerical search: one for every problem, or a list (or rows of a 2d
+    # array) with one per problem, None entries keeping the default warm start; a starting point whose length does
+    # not match the problem's assets is ignored
+    # the result is a scipy OptimizeResult whose x holds the weights of the chosen assets
+    def __init__(self, returns=None, mean=None, cov=None):
+        if returns is not None:
+            mean, cov = annualised_moments(returns)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.cov = np.asarray(cov, dtype=np.float64)
+
+    def statistics(self, weights, risk_free_rate=0, assets=None):
+        mean, cov = self._subset(assets)
+        portfolio_return = weights @ mean
+        portfolio_volatility = np.sqrt(weights @ cov @ weights)
+        return np.array([portfolio_return, portfolio_volatility, (portfolio_return - risk_free_rate) / portfolio_volatility])
+
+    def _subset(self, assets):
+        if assets is None:
+            return self.mean, self.cov
+        assets = np.asarray(assets)
+        return self.mean[assets], self.cov[np.ix_(assets, assets)]
+
+    @staticmethod
+    def _negative_sharpe(weights, mean, cov, risk_free_rate):
+        # -S(w) and its gradient, S(w) = (w.mu - rf) / sqrt(w'Cw)
+        # dS/dw = mu / sigma - (w.mu - rf) * C w / sigma^3
+        cov_weights = cov @ weights
+        volatility = np.sqrt(weights @ cov_weights)
+        excess = weights @ mean - risk_free_rate
+        gradient = mean / volatility - excess * cov_weights / volatility ** 3
+        return -excess / volatility, -gradient
+
+    @staticmethod
+    def _bounds(bounds, num_assets):
+        if bounds is None:
+            return None
+        bounds = np.asarray(bounds, dtype=np.float64)
+        return np.broadcast_to(bounds, (num_assets, 2))
+
+    def optimize(self, risk_free_rate=0, bounds=(0, 1), assets=None, x0=None):
+        return self.optimize_many([risk_free_rate], [bounds], [assets], x0)[0]
+
+    def optimize_many(self, risk_free_rates, bounds=None, assets=None, x0=None):
+        # solves one problem per risk free rate; bounds and assets are lists of the same length (or None)
+        # problems sharing the same assets share one Cholesky factorisation, and all of their closed form
+        # tangency portfolios come out of a single solve with one right hand side per problem
+        num_problems = len(risk_free_rates)
+        bounds = [(0, 1)] * num_problems if bounds is None else bounds
+        assets = [None] * num_problems if assets is None else assets
+        results = [None] * num_problems
+        starts = self._starting_points(x0, num_problems)
+
+        groups = {}
+        for i, subset in enumerate(assets):
+            groups.setdefault(None if subset is None else tuple(subset), []).append(i)
+
+        for subset, problems in groups.items():
+            mean, cov = self._subset(subset)
+            factor = cho_factor(cov)
+            rates = np.array([risk_free_rates[i] for i in problems])
+            # tangency portfolio: w is proportional to C^-1 (mu - rf)
+            directions = cho_solve(factor, mean[:, None] - rates[None, :])
+
+            for column, i in enumerate(problems):
+                results[i] = self._solve(mean, cov, risk_free_rates[i], self._bounds(bounds[i], len(mean)), directions[:, column], starts[i])
+
+        return results
+
+    @staticmethod
+    def _starting_points(x0, num_problems):
+        if x0 is None:
+            return [None] * num_problems
+        if any(x is None or np.ndim(x) > 0 for x in x0):
+            if len(x0) != num_problems:
+                raise ValueError('%d starting points given for %d problems' % (len(x0), num_problems))
+            return list(x0)
+        return [x0] * num_problems
+
+    def _solve(self, mean, cov, risk_free_rate, bounds, direction, x0):
+        total = direction.sum()
+        if total > 0:
+            tangency = direction / total
+            # the unconstrained optimum is also the constrained one whenever it satisfies the bounds
+            if bounds is None or np.all((tangency >= bounds[:, 0] - 1e-12) & (tangency <= bounds[:, 1] + 1e-12)):
+                sharpe = -self._negative_sharpe(tangency, mean, cov, risk_free_rate)[0]
+                return optimization.OptimizeResult(x=tangency, fun=-sharpe, success=True, nit=0,
+                                                   message='closed form tangency portfolio')
+            # otherwise warm start from the tangency portfolio pulled back inside the bounds
+            start = np.clip(tangency, bounds[:, 0], bounds[:, 1])
+        else:
+            start = np.full(len(mean), 1 / len(mean))
+        if x0 is not None and len(x0) == len(mean):
+            start = np.asarray(x0, dtype=np.float64)
+        start = start / start.sum()
+
+        # one constraint is that the sum of weights is 1
+        constraints = {'type': 'eq', 'fun': lambda x: np.sum(x) - 1, 'jac': lambda x: np.ones_like(x)}
+        return optimization.minimize(fun=self._negative_sharpe, x0=start, args=(mean, cov, risk_free_rate), jac=True,
+                                     method='SLSQP', bounds=None if bounds is None else [tuple(b) for b in bounds],
+                                     constraints=constraints, options={'maxiter': 1000})
+
 def optimize_portfolio(weights, returns):
-    # one constraint is that the sum of weights is 1
-    constraints = {'type':'eq', 'fun': lambda x: np.sum(x)-1}
-    # each weight is between 0 and 1
-    bounds = tuple((0,1) for _ in range(len(tickers)))
-    return optimization.minimize(fun=min_function_sharpe, x0=weights[0], args=(returns,), method='SLSQP', bounds=bounds, constraints=constraints)
+    # each weight is between 0 and 1; the numerical search starts from the first of the simulated portfolios
+    # (weights, as returned by generate_portfolios) when given, otherwise from the tangency portfolio
+    return SharpeOptimizer(returns).optimize(bounds=(0, 1), x0=None if weights is None else weights[0])
 
 def print_optimal_portfolio(optimal_portfolio_weights, returns):
     print("Optimal portfolio: ", optimal_portfolio_weights.round(3))
@@ -112,7 +258,7 @@ if __name__ == '__main__':
     dataset = download_data()
     show_data(dataset)
 
-    log_daily_returns = calculate_returns(dataset)
+    log_daily_returns = load_log_returns()
     show_statistics(log_daily_returns)
 
     portfolio_weights, portfolio_returns, portfolio_volatilities = generate_portfolios(log_daily_returns)
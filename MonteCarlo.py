@@ -1,29 +1,85 @@
+import time
 import numpy as np
-import pandas as pd
 import matplotlib.pyplot as plt
+import StochasticProcesses
 
 NUM_SIMULATIONS = 1000
+# paths simulated together, memory is CHUNK_SIZE * (N+1) floats however many paths are run
+CHUNK_SIZE = 8192
+PERCENTILES = (5, 25, 50, 75, 95)
+# percentiles are read from a histogram per time step of the log price in standard deviations from its mean,
+# NUM_BINS bins over [-Z_RANGE, Z_RANGE] (anything beyond goes into the outermost bins)
+NUM_BINS = 4000
+Z_RANGE = 8.0
+# paths kept for the fan chart
+NUM_SAMPLE_PATHS = 20
 
-def stock_monte_carlo(S0, mu, sigma, N=1000):
-    result = []
+# per-step statistics of S(t) = S0 exp((mu - sigma^2/2) t + sigma W(t)) over num_simulations paths on the grid
+# t = 0, dt, ..., N*dt, without ever holding all the paths: log prices are simulated as cumulative sums chunk by chunk
+# and only running sums, the min/max envelope and the histograms are kept, so memory is O(N) rather than O(paths * N)
+# returns a dict with 't', 'mean', 'min', 'max' (each N+1 long), 'percentiles' (one row per entry of percentiles)
+# and 'sample_paths' (num_sample_paths x N+1)
+# rng can be a numpy Generator, by default the global np.random state is used
+def stock_monte_carlo(S0, mu, sigma, N=1000, rng=None, num_simulations=NUM_SIMULATIONS, dt=1.0, percentiles=PERCENTILES,
+                      num_sample_paths=NUM_SAMPLE_PATHS, plot=False, chunk_size=CHUNK_SIZE):
+    # log S is an arithmetic Brownian motion with drift mu - sigma^2/2
+    process = StochasticProcesses.WienerProcess(mu - 0.5 * sigma ** 2, sigma)
+    t = StochasticProcesses.time_grid(N * dt, N)
+    # exact mean and standard deviation of log S(t), the coordinates the histograms are built in
+    log_mean = np.log(S0) + (mu - 0.5 * sigma ** 2) * t
+    log_std = sigma * np.sqrt(t)
+    log_std[0] = 1.0
 
-    # possible S(t) realisations of the process
-    for _ in range(NUM_SIMULATIONS):
-        prices = [S0]
-        for _ in range(N):
-            stock_price = prices[-1] * np.exp((mu - 0.5 * sigma ** 2) + sigma * np.random.normal())
-            prices.append(stock_price)
+    total = np.zeros(N+1)
+    lowest = np.full(N+1, np.inf)
+    highest = np.full(N+1, -np.inf)
+    counts = np.zeros((N+1) * NUM_BINS, dtype=np.int32)
+    bin_width = 2 * Z_RANGE / NUM_BINS
+    # offset of the histogram of every time step in the flattened counts
+    offsets = np.arange(N+1) * NUM_BINS
+    sample_paths = None
 
-        result.append(prices)
+    for start, log_prices in StochasticProcesses.simulate_chunks(process, np.log(S0), N * dt, N, num_simulations, rng,
+                                                                 chunk_size=chunk_size):
+        lowest = np.minimum(lowest, log_prices.min(axis=0))
+        highest = np.maximum(highest, log_prices.max(axis=0))
+        bins = np.clip(((log_prices - log_mean) / log_std + Z_RANGE) / bin_width, 0, NUM_BINS - 1).astype(np.int64)
+        counts += np.bincount((bins + offsets).ravel(), minlength=counts.size)
+        if sample_paths is None:
+            sample_paths = np.exp(log_prices[:num_sample_paths])
+        np.exp(log_prices, out=log_prices)
+        total += log_prices.sum(axis=0)
 
-    simulation_data = pd.DataFrame(result)
-    simulation_data = simulation_data.T
+    # percentiles of the log price, interpolating linearly inside the bin where the cumulative count crosses them
+    counts = counts.reshape(N+1, NUM_BINS)
+    cumulative = np.cumsum(counts, axis=1)
+    quantiles = []
+    for q in percentiles:
+        target = q / 100 * num_simulations
+        index = np.minimum((cumulative < target).sum(axis=1), NUM_BINS - 1)
+        rows = np.arange(N+1)
+        below = cumulative[rows, index] - counts[rows, index]
+        fraction = (target - below) / np.maximum(counts[rows, index], 1)
+        z = -Z_RANGE + (index + fraction) * bin_width
+        quantiles.append(np.clip(log_mean + z * log_std, lowest, highest))
 
-    mean = simulation_data.mean(axis=1)
+    statistics = {'t': t, 'mean': total / num_simulations, 'min': np.exp(lowest), 'max': np.exp(highest),
+                  'percentiles': np.exp(np.array(quantiles)), 'sample_paths': sample_paths}
+    if plot:
+        plot_fan_chart(statistics, percentiles)
+    return statistics
 
+def plot_fan_chart(statistics, percentiles=PERCENTILES):
+    # bands between the outermost percentiles working inwards, the min/max envelope and a few sample paths
+    t, bands = statistics['t'], statistics['percentiles']
     plt.figure(figsize=(10,6))
-    plt.plot(simulation_data)
-    plt.plot(mean, linewidth=3, color='black', label='Average')
+    for i in range(len(percentiles) // 2):
+        plt.fill_between(t, bands[i], bands[-1-i], color='tab:blue', alpha=0.2,
+                         label='%g-%g percentile' % (percentiles[i], percentiles[-1-i]))
+    plt.plot(t, statistics['sample_paths'].T, linewidth=0.5, alpha=0.6)
+    plt.plot(t, statistics['min'], 'k--', linewidth=1, label='Min / max')
+    plt.plot(t, statistics['max'], 'k--', linewidth=1)
+    plt.plot(t, statistics['mean'], linewidth=3, color='black', label='Average')
     plt.xlabel('Time', fontsize=16)
     plt.ylabel('Stock price', fontsize=16)
     plt.legend(fontsize=16)
@@ -31,5 +87,24 @@ def stock_monte_carlo(S0, mu, sigma, N=1000):
     plt.show()
 
 
+# n independent draws of S(N), the sampler interface used by ParallelMonteCarlo
+# the sum of N independent normal log increments is a single normal so S(N) is drawn in one step
+def terminal_price_samples(rng, n, S0, mu, sigma, N=1000):
+    return S0 * np.exp((mu - 0.5 * sigma ** 2) * N + sigma * np.sqrt(N) * rng.standard_normal(n))
+
+def benchmark_statistics(num_simulations=100000, N=1000):
+    start = time.perf_counter()
+    statistics = stock_monte_carlo(50, 0.0001, 0.01, N, np.random.default_rng(0), num_simulations)
+    print('%d paths x %d steps of headless statistics in %.2fs' % (num_simulations, N, time.perf_counter() - start))
+
+    # against exact percentiles of the full path matrix on a shorter horizon, same paths
+    statistics = stock_monte_carlo(50, 0.0001, 0.01, 250, np.random.default_rng(1), 50000)
+    _, paths = StochasticProcesses.simulate(StochasticProcesses.GeometricBrownianMotion(0.0001, 0.01), 50, 250, 250, 50000,
+                                            np.random.default_rng(1), chunk_size=CHUNK_SIZE)
+    exact = np.percentile(paths, PERCENTILES, axis=0)
+    print('largest relative percentile error against the full matrix: %.2e'
+          % np.max(np.abs(statistics['percentiles'] / exact - 1)))
+
 if __name__ == '__main__':
-    stock_monte_carlo(50, 0.0001, 0.01)
\ No newline at end of file
+    stock_monte_carlo(50, 0.0001, 0.01, plot=True)
+    benchmark_statistics()
@@ -1,4 +1,26 @@
+import time
 import numpy as np
+from scipy.stats import norm
+from scipy.special import ndtri
+from RunningStatistics import RunningStatistics
+from BlackScholes import call_option_price, put_option_price, option_chain
+
+# number of draws held in memory at once by the streaming simulation
+BATCH_SIZE = 100000
+# independent replicates used to measure the error of estimators whose samples are not independent
+REPLICATIONS = 20
+# equal probability strata used by stratified sampling
+NUM_STRATA = 100
+# relative distance of the strike of the Black-Scholes control from the strike being priced
+CONTROL_STRIKE_OFFSET = 0.05
+
+VARIANCE_REDUCTION_METHODS = ('crude', 'antithetic', 'control_stock', 'control_black_scholes',
+                              'moment_matching', 'stratified', 'latin_hypercube')
+GREEK_METHODS = ('pathwise', 'likelihood_ratio', 'bump')
+PAYOFFS = ('vanilla', 'digital')
+# bump sizes of the common random numbers Greeks: relative for S0 and sigma, absolute for the rate
+BUMP = 1e-2
+RATE_BUMP = 1e-4
 
 class OptionsPricing:
     def __init__(self, S0, E, T, rf, sigma, iterations):
@@ -8,36 +30,251 @@ class OptionsPricing:
         self.rf = rf
         self.sigma = sigma
         self.iterations = iterations
-    
-    def call_option_simulation(self):
-        z = np.random.normal(0, 1, self.iterations)
 
+    def terminal_prices(self, z):
         # simulate stock price at time T by simulating dS_t = \r_f*S_t*dt + \sigma * S_t * dW_t^Q
         # notice we are using risk neutral measure and using r_f instead of mu now
         # expected growth of asset = risk-free rate - the entire foundation of risk-free pricing
-        stock_price_simulations = self.S0 * np.exp((self.rf - 0.5 * self.sigma ** 2)*self.T + self.sigma * np.sqrt(self.T) * z)
-        
-        payoffs = np.maximum(stock_price_simulations - self.E, 0)
-        # work out the average payoff amongst all simulations
-        avg_payoff = np.mean(payoffs)
+        return self.S0 * np.exp((self.rf - 0.5 * self.sigma ** 2)*self.T + self.sigma * np.sqrt(self.T) * z)
+
+    def discounted_payoffs(self, z, option_type='call'):
+        stock_price_simulations = self.terminal_prices(z)
+        if option_type == 'call':
+            payoffs = np.maximum(stock_price_simulations - self.E, 0)
+        else:
+            payoffs = np.maximum(self.E - stock_price_simulations, 0)
         # discount to present time
-        return avg_payoff * np.exp(-self.rf * self.T)
-    
+        return payoffs * np.exp(-self.rf * self.T)
+
+    def _payoffs(self, stock, option_type, payoff):
+        # undiscounted payoff at expiry: vanilla max(S - E, 0) / max(E - S, 0), or a cash-or-nothing digital paying 1
+        # when the option ends in the money
+        moneyness = stock - self.E if option_type == 'call' else self.E - stock
+        return np.maximum(moneyness, 0) if payoff == 'vanilla' else (moneyness > 0).astype(np.float64)
+
+    def sample_payoffs(self, rng, n, option_type='call'):
+        # n independent discounted payoffs, the sampler interface used by ParallelMonteCarlo
+        return self.discounted_payoffs(rng.standard_normal(n), option_type)
+
+    def call_option_simulation(self):
+        z = np.random.normal(0, 1, self.iterations)
+        # work out the average payoff amongst all simulations
+        return np.mean(self.discounted_payoffs(z, 'call'))
+
     def put_option_simulation(self):
         z = np.random.normal(0, 1, self.iterations)
+        return np.mean(self.discounted_payoffs(z, 'put'))
+
+    def streaming_simulation(self, option_type='call', batch_size=BATCH_SIZE, target_std_error=None,
+                             target_ci_width=None, confidence=0.95, time_budget=None, rng=None):
+        # draws batches of batch_size until the standard error or the width of the confidence interval
+        # reaches its target, the time budget (in seconds) runs out, or self.iterations samples have been used
+        # only one batch is ever held in memory, however many iterations are run
+        # returns (price, standard error, samples used, wall time in seconds)
+        rng = np.random if rng is None else rng
+        # a confidence interval of width w is mean +/- z * std_error, so it is a standard error target of w / (2z)
+        if target_ci_width is not None:
+            ci_target = target_ci_width / (2 * norm.ppf(0.5 + confidence / 2))
+            target_std_error = ci_target if target_std_error is None else min(target_std_error, ci_target)
+
+        stats = RunningStatistics()
+        start = time.perf_counter()
+        while stats.count < self.iterations:
+            z = rng.standard_normal(min(batch_size, self.iterations - stats.count))
+            stats.update(self.discounted_payoffs(z, option_type))
+
+            if target_std_error is not None and stats.std_error() <= target_std_error:
+                break
+            if time_budget is not None and time.perf_counter() - start >= time_budget:
+                break
+
+        return stats.mean, stats.std_error(), stats.count, time.perf_counter() - start
 
-        stock_price_simulations = self.S0 * np.exp((self.rf - 0.5 * self.sigma ** 2)*self.T + self.sigma * np.sqrt(self.T) * z)
-        
-        option_data = np.zeros([self.iterations, 2])
-        
-        option_data[:, 1] = self.E - stock_price_simulations
+    def variance_reduction_simulation(self, option_type='call', method='antithetic', rng=None,
+                                      replications=REPLICATIONS, num_strata=NUM_STRATA, control_strike=None):
+        # returns (price, standard error, variance reduction factor)
+        # the variance reduction factor is the variance crude Monte Carlo would have with the same number of draws
+        # divided by the variance of this estimator, i.e. how many times more draws crude Monte Carlo would need
+        if method not in VARIANCE_REDUCTION_METHODS:
+            raise ValueError('unknown variance reduction method %r' % method)
+        rng = np.random if rng is None else rng
+        n = self.iterations
 
-        payoffs = np.max(option_data, axis=1)
-        avg_payoff = np.mean(payoffs)
+        if method in ('crude', 'antithetic', 'control_stock', 'control_black_scholes'):
+            # these estimators average independent samples so their error comes straight from the sample variance
+            if method == 'antithetic':
+                # pair every draw z with -z, the two payoffs are negatively correlated so their average varies less
+                z = rng.standard_normal(n // 2)
+                payoffs = np.concatenate((self.discounted_payoffs(z, option_type), self.discounted_payoffs(-z, option_type)))
+                samples = 0.5 * (payoffs[:n // 2] + payoffs[n // 2:])
+            else:
+                z = rng.standard_normal(n)
+                payoffs = self.discounted_payoffs(z, option_type)
+                samples = payoffs
 
-        return avg_payoff * np.exp(-self.rf * self.T)
+            if method in ('control_stock', 'control_black_scholes'):
+                control, control_mean = self._control_variate(z, method, option_type, control_strike)
+                # optimal coefficient b = cov(payoff, control) / var(control) estimated from the same batch
+                covariance = np.cov(payoffs, control)
+                b = covariance[0, 1] / covariance[1, 1]
+                samples = payoffs - b * (control - control_mean)
+
+            price = np.mean(samples)
+            estimator_variance = np.var(samples, ddof=1) / samples.size
+        else:
+            # stratified and moment matched samples are not independent, so the error is measured
+            # from independent replicates of the whole estimator
+            m = n // replications
+            estimates = np.empty(replications)
+            payoffs = []
+            for i in range(replications):
+                z = self._replicate_normals(m, method, rng, num_strata)
+                payoffs.append(self.discounted_payoffs(z, option_type))
+                estimates[i] = np.mean(payoffs[-1])
+            payoffs = np.concatenate(payoffs)
+            price = np.mean(estimates)
+            estimator_variance = np.var(estimates, ddof=1) / replications
+
+        # every individual payoff is still a draw from the true payoff distribution, so their pooled
+        # variance estimates the per-draw variance of crude Monte Carlo
+        crude_variance = np.var(payoffs, ddof=1) / payoffs.size
+        return price, np.sqrt(estimator_variance), crude_variance / estimator_variance
+
+    def greeks_simulation(self, option_type='call', payoff='vanilla', method='pathwise', rng=None,
+                          bump=BUMP, rate_bump=RATE_BUMP):
+        # price, delta, gamma, vega and rho from one set of draws, every Greek is the mean of a per-path sample so
+        # it costs a few array operations on top of the price rather than more simulations
+        #   'pathwise'         - differentiates the discounted payoff along each path, S_T is linear in S0 so
+        #                        dS_T/dS0 = S_T/S0, dS_T/dsigma = S_T (sqrt(T) z - sigma T), dS_T/dr = T S_T;
+        #                        the payoff must be continuous (vanilla) and as its derivative jumps at the strike,
+        #                        gamma applies the likelihood ratio to the pathwise delta: e^(-rT) E/S0^2 1{ITM} z/(sigma sqrt(T))
+        #   'likelihood_ratio' - differentiates the density of S_T instead: the Greek is the payoff times a score
+        #                        weight, so it works for discontinuous payoffs such as digitals (noisier for vanillas)
+        #   'bump'             - central finite differences with common random numbers: the bumped prices reuse
+        #                        the same draws so most of the noise cancels; a fallback for payoffs without either
+        # returns (greeks, standard errors), two dicts keyed like BlackScholes.option_chain
+        # rng can be a numpy Generator, by default the global np.random state is used
+        if method not in GREEK_METHODS:
+            raise ValueError('unknown Greek method %r' % method)
+        if payoff not in PAYOFFS:
+            raise ValueError('unknown payoff %r' % payoff)
+        if method == 'pathwise' and payoff != 'vanilla':
+            raise ValueError('pathwise Greeks need a continuous payoff, use likelihood_ratio or bump')
+        rng = np.random if rng is None else rng
+        z = rng.standard_normal(self.iterations)
+        S0, T, sigma = self.S0, self.T, self.sigma
+        discount = np.exp(-self.rf * T)
+        stock = self.terminal_prices(z)
+        prices = discount * self._payoffs(stock, option_type, payoff)
+        samples = {'price': prices}
+
+        if method == 'pathwise':
+            # discounted derivative of the payoff with respect to S_T: 1 (call) or -1 (put) in the money, 0 otherwise
+            phi = 1.0 if option_type == 'call' else -1.0
+            slope = phi * discount * (phi * (stock - self.E) > 0)
+            samples['delta'] = slope * stock / S0
+            samples['gamma'] = slope * self.E / S0 ** 2 * z / (sigma * np.sqrt(T))
+            samples['vega'] = slope * stock * (np.sqrt(T) * z - sigma * T)
+            samples['rho'] = slope * stock * T - T * prices
+        elif method == 'likelihood_ratio':
+            # scores of the lognormal density of S_T, z = (log(S_T/S0) - (r - sigma^2/2) T) / (sigma sqrt(T))
+            samples['delta'] = prices * z / (S0 * sigma * np.sqrt(T))
+            samples['gamma'] = prices * ((z ** 2 - 1) / (sigma ** 2 * T) - z / (sigma * np.sqrt(T))) / S0 ** 2
+            samples['vega'] = prices * ((z ** 2 - 1) / sigma - z * np.sqrt(T))
+            # the rate moves the mean of log S_T (score z sqrt(T) / sigma) and the discount factor (-T)
+            samples['rho'] = prices * (z * np.sqrt(T) / sigma - T)
+        else:
+            def bumped(S0=S0, rf=self.rf, sigma=sigma):
+                option = OptionsPricing(S0, self.E, T, rf, sigma, self.iterations)
+                return np.exp(-rf * T) * option._payoffs(option.terminal_prices(z), option_type, payoff)
+            h = bump * S0
+            up, down = bumped(S0=S0 + h), bumped(S0=S0 - h)
+            samples['delta'] = (up - down) / (2 * h)
+            samples['gamma'] = (up - 2 * prices + down) / h ** 2
+            samples['vega'] = (bumped(sigma=sigma * (1 + bump)) - bumped(sigma=sigma * (1 - bump))) / (2 * bump * sigma)
+            samples['rho'] = (bumped(rf=self.rf + rate_bump) - bumped(rf=self.rf - rate_bump)) / (2 * rate_bump)
+
+        greeks = {name: np.mean(values) for name, values in samples.items()}
+        std_errors = {name: np.std(values, ddof=1) / np.sqrt(self.iterations) for name, values in samples.items()}
+        return greeks, std_errors
+
+    def _control_variate(self, z, method, option_type, control_strike):
+        if method == 'control_stock':
+            # the discounted stock price is a martingale under the risk neutral measure, so its mean is S0
+            return self.terminal_prices(z) * np.exp(-self.rf * self.T), self.S0
+
+        # the control is an option of the same type whose expectation is known in closed form from the Black-Scholes
+        # formula; by default its strike is CONTROL_STRIKE_OFFSET away from E: its payoff then differs from the one
+        # being priced only between the two strikes, so the two are almost perfectly correlated (near the money too,
+        # where an opposite type control is weak), while it is still a different option rather than the answer itself
+        strike = self.E * (1 + CONTROL_STRIKE_OFFSET) if control_strike is None else control_strike
+        control_option = OptionsPricing(self.S0, strike, self.T, self.rf, self.sigma, self.iterations)
+        pricer = call_option_price if option_type == 'call' else put_option_price
+        return control_option.discounted_payoffs(z, option_type), pricer(self.S0, strike, self.T, self.rf, self.sigma)
+
+    def _replicate_normals(self, m, method, rng, num_strata):
+        if method == 'moment_matching':
+            # rescale the draws so their sample mean and standard deviation are exactly 0 and 1
+            z = rng.standard_normal(m)
+            return (z - z.mean()) / z.std()
+
+        # stratified sampling: split (0,1) into equal probability strata and draw the same number of uniforms in each
+        # with one draw per stratum this is Latin hypercube sampling of the (one dimensional) terminal normal
+        # there are never more strata than draws, and the m % strata leftover draws go one each to the first strata
+        # so exactly m normals come back
+        strata = m if method == 'latin_hypercube' else min(num_strata, m)
+        per_stratum, leftover = divmod(m, strata)
+        stratum = np.repeat(np.arange(strata), per_stratum + (np.arange(strata) < leftover))
+        u = (stratum + rng.random(stratum.size)) / strata
+        return ndtri(u)
+
+def benchmark_greeks(iterations=10**6):
+    # cost of all the Greeks against one pricing run, and the error of each method against Black-Scholes
+    op = OptionsPricing(100, 100, 1, 0.05, 0.2, iterations)
+    exact = option_chain(100, 100, 1, 0.05, 0.2, 'call')
+    start = time.perf_counter()
+    op.discounted_payoffs(np.random.default_rng(0).standard_normal(iterations), 'call')
+    pricing_time = time.perf_counter() - start
+    print('one pricing run of %d paths: %.3fs' % (iterations, pricing_time))
+
+    for method in GREEK_METHODS:
+        start = time.perf_counter()
+        greeks, std_errors = op.greeks_simulation('call', 'vanilla', method, np.random.default_rng(1))
+        elapsed = time.perf_counter() - start
+        print('%-16s %4.1fx the pricing time  ' % (method, elapsed / pricing_time)
+              + '  '.join('%s %.4f +- %.4f (exact %.4f)' % (name, greeks[name], std_errors[name], exact[name])
+                          for name in ('delta', 'gamma', 'vega', 'rho')))
+
+    # the same delta bump with independent draws for the up and down prices instead of common random numbers
+    h = BUMP * 100
+    up = OptionsPricing(100 + h, 100, 1, 0.05, 0.2, iterations).sample_payoffs(np.random.default_rng(2), iterations)
+    down = OptionsPricing(100 - h, 100, 1, 0.05, 0.2, iterations).sample_payoffs(np.random.default_rng(3), iterations)
+    print('delta bumped with independent draws: %.4f +- %.4f' % ((up.mean() - down.mean()) / (2 * h),
+          np.sqrt(up.var(ddof=1) + down.var(ddof=1)) / (2 * h * np.sqrt(iterations))))
+
+    # digital call, its Greeks need likelihood ratio weights or bumping
+    for method in ('likelihood_ratio', 'bump'):
+        greeks, std_errors = op.greeks_simulation('call', 'digital', method, np.random.default_rng(1))
+        print('digital %-16s ' % method + '  '.join('%s %.5f +- %.5f' % (name, greeks[name], std_errors[name])
+                                                  for name in ('delta', 'gamma', 'vega', 'rho')))
 
 if __name__ == '__main__':
     op = OptionsPricing(100, 100, 1, 0.05, 0.2, 1000000)
     print('Value of call option £%.2f' % op.call_option_simulation())
-    print('Value of put option £%.2f' % op.put_option_simulation())
\ No newline at end of file
+    print('Value of put option £%.2f' % op.put_option_simulation())
+
+    # stop as soon as the price is known to within a penny, with at most 10^9 draws in constant memory
+    price, std_error, samples, wall_time = OptionsPricing(100, 100, 1, 0.05, 0.2, 10**9).streaming_simulation(target_std_error=0.01)
+    print('Streaming call price £%.4f +/- %.4f from %d samples in %.2fs' % (price, std_error, samples, wall_time))
+
+    op = OptionsPricing(100, 100, 1, 0.05, 0.2, 100000)
+    for method in VARIANCE_REDUCTION_METHODS:
+        price, std_error, factor = op.variance_reduction_simulation('call', method)
+        print('%-22s call £%.4f +/- %.4f  variance reduction %8.1fx' % (method, price, std_error, factor))
+
+    # fewer draws per replicate (1001 // REPLICATIONS = 50) than NUM_STRATA: the strata shrink to fit the draws
+    price, std_error, _ = OptionsPricing(100, 100, 1, 0.05, 0.2, 1001).variance_reduction_simulation('call', 'stratified')
+    assert np.isfinite(price) and np.isfinite(std_error)
+    print('stratified call from 1001 draws £%.4f +/- %.4f' % (price, std_error))
+
+    benchmark_greeks()
@@ -1,16 +1,13 @@
 from math import log
 import numpy as np
 import datetime
-import yfinance as yf
 import pandas as pd
+from ParallelMonteCarlo import parallel_lower_quantile
+from MarketData import get_prices
 
-def download_data(ticker, start, end):
-    ticker_data = yf.download(ticker, start=start, end=end, auto_adjust=False)
-    
-    data = {}
-    data[ticker] = ticker_data[['Adj Close']].squeeze()
-
-    return pd.DataFrame(data)
+def download_data(ticker, start, end, store=None):
+    # adjusted close prices read through the shared on-disk cache (MarketData.PriceStore)
+    return get_prices(ticker, start, end, store)
 
 
 class VaR:
@@ -23,13 +20,18 @@ class VaR:
         self.n = n
         self.iterations = iterations
 
-    def simulation(self):
-        rand = np.random.normal(size=self.iterations)
+    def simulate_prices(self, rng, n):
+        rand = rng.normal(size=n)
 
         # geometric random walk simulation of stock price
         # recall, SDE is dS = mu * S * dt + sigma * S * dW
         # W is Wiener process i.e. dW ~ N(0, dt^2)
-        stock_price_simulations = self.S * np.exp((self.mu - 0.5 * self.sigma ** 2)*self.n + self.sigma * np.sqrt(self.n) * rand)
+        return self.S * np.exp((self.mu - 0.5 * self.sigma ** 2)*self.n + self.sigma * np.sqrt(self.n) * rand)
+
+    def simulation(self, rng=None):
+        # rng can be a numpy Generator, by default the global np.random state is used
+        rng = np.random if rng is None else rng
+        stock_price_simulations = self.simulate_prices(rng, self.iterations)
 
         # 95% VaR means I am 95% confident my loses will not exceed this amount
         # i.e. 5% confident my losses will be less than this amount
@@ -40,6 +42,90 @@ class VaR:
         # maximum possible loss - VaR
         return self.S - percentile
 
+    def parallel_simulation(self, num_workers=None, seed=None):
+        # same VaR as simulation() but with the scenarios split across a process pool
+        # the result is reproducible for a given seed and number of workers
+        return self.S - parallel_lower_quantile(self.simulate_prices, 1-self.c, self.iterations, num_workers, seed)
+
+# scenarios simulated together by PortfolioVaR, bounds memory at BATCH_SIZE * number of assets
+BATCH_SIZE = 100000
+
+class PortfolioVaR:
+    # VaR and expected shortfall of a portfolio of correlated assets, for several confidence levels in one run
+    # positions are the amounts invested in each asset, mu and cov the mean vector and covariance matrix
+    # of their daily log returns, n the horizon in days
+    # scenarios are generated in batches and only the worst ones are kept (a top-k tail buffer): memory is
+    # batch_size * assets for the batch plus tail_size * assets for the buffer, tail_size a little over
+    # ceil(iterations * (1 - lowest confidence)); the buffer is what VaR, ES and their attribution are read from, so it grows with iterations at that
+    # rate, and for very large runs the lowest confidence level (or the iterations) is what bounds it
+    def __init__(self, positions, confidences, mu, cov, n, iterations, batch_size=BATCH_SIZE):
+        self.positions = np.asarray(positions, dtype=np.float64)
+        self.confidences = np.atleast_1d(np.asarray(confidences, dtype=np.float64))
+        self.mu = np.asarray(mu, dtype=np.float64)
+        self.cov = np.asarray(cov, dtype=np.float64)
+        # correlated normals through the Cholesky factor L of the covariance matrix: cov(Z L') = L L' = cov
+        self.cholesky = np.linalg.cholesky(self.cov)
+        self.n = n
+        self.iterations = iterations
+        self.batch_size = batch_size
+        # number of worst scenarios that VaR and ES at every confidence level are read from, plus sqrt of that many
+        # ranked just beyond the deepest VaR, so attribution (RiskAttribution.SimulatedAttribution) can average
+        # scenarios on both sides of it
+        deepest = int(self._tail_counts(self.confidences.min()))
+        self.tail_size = min(deepest + int(np.sqrt(deepest)) + 1, iterations)
+        # filled by simulation(): losses of the tail scenarios (worst first) and the P&L of every asset in them
+        self.tail_losses = None
+        self.tail_scenarios = None
+
+    def simulate_pnl(self, rng, n):
+        # (n x assets) profit and loss of every position over the horizon
+        z = rng.standard_normal((n, len(self.positions))) @ self.cholesky.T
+        log_returns = (self.mu - 0.5 * np.diag(self.cov)) * self.n + np.sqrt(self.n) * z
+        return self.positions * np.expm1(log_returns)
+
+    def simulation(self, rng=None):
+        # returns (VaR, ES) as arrays with one entry per confidence level, both as positive losses
+        rng = np.random if rng is None else rng
+        k = self.tail_size
+        tail_losses = np.full(k, -np.inf)
+        tail_scenarios = np.zeros((k, len(self.positions)))
+        # the k-th worst loss so far, only scenarios beyond it can enter the tail
+        threshold = -np.inf
+
+        for start in range(0, self.iterations, self.batch_size):
+            pnl = self.simulate_pnl(rng, min(self.batch_size, self.iterations - start))
+            # portfolio loss of every scenario, aggregated straight away
+            losses = -pnl.sum(axis=1)
+            candidates = np.flatnonzero(losses > threshold)
+            if candidates.size == 0:
+                continue
+            if candidates.size > k:
+                candidates = candidates[np.argpartition(losses[candidates], candidates.size - k)[-k:]]
+            # the k worst of the buffer and the candidates, which are written over the buffer rows that drop out
+            # so the scenario rows never move
+            combined = np.concatenate((tail_losses, losses[candidates]))
+            worst = np.argpartition(combined, combined.size - k)[-k:]
+            dropped = np.ones(k, dtype=bool)
+            dropped[worst[worst < k]] = False
+            entering = candidates[worst[worst >= k] - k]
+            tail_losses[dropped] = losses[entering]
+            tail_scenarios[dropped] = pnl[entering]
+            threshold = combined[worst].min()
+
+        order = np.argsort(tail_losses)[::-1]
+        self.tail_losses, self.tail_scenarios = tail_losses[order], tail_scenarios[order]
+        return self.var_es()
+
+    def _tail_counts(self, confidences):
+        # m = ceil((1-c) * iterations), with a small tolerance so e.g. (1-0.95) * 10^6 is not rounded up to 50001
+        return np.maximum(np.ceil((1 - confidences) * self.iterations - 1e-6).astype(int), 1)
+
+    def var_es(self):
+        # VaR at confidence c is the m-th worst loss with m = ceil((1-c) * iterations), ES the mean of the m worst
+        m = self._tail_counts(self.confidences)
+        cumulative = np.cumsum(self.tail_losses)
+        return self.tail_losses[m - 1], cumulative[m - 1] / m
+
 if __name__ == '__main__':
     S=1e6
     iterations = 100000
@@ -63,3 +149,11 @@ if __name__ == '__main__':
     print('1-day VaR at 95 using Monte Carlo simulations: £%.2f' % VaR(S, 0.95, mu, sigma, 1, iterations).simulation())
     print('1-day VaR at 99 using Monte Carlo simulations: £%.2f' % VaR(S, 0.99, mu, sigma, 1, iterations).simulation())
     print('1-year VaR at 95 using Monte Carlo simulations: £%.2f' % VaR(S, 0.95, mu, sigma, 252, iterations).simulation())
+
+    # three correlated assets held together
+    positions = np.array([4e5, 3e5, 3e5])
+    vols = np.array([0.02, 0.015, 0.01])
+    correlation = np.array([[1.0, 0.6, 0.3], [0.6, 1.0, 0.4], [0.3, 0.4, 1.0]])
+    portfolio = PortfolioVaR(positions, [0.95, 0.99], np.full(3, 0.0003), correlation * np.outer(vols, vols), 1, 1000000)
+    var, es = portfolio.simulation()
+    print('Portfolio 1-day VaR at 95/99: £%.2f / £%.2f, ES: £%.2f / £%.2f' % (var[0], var[1], es[0], es[1]))
@@ -1,22 +1,24 @@
 import numpy as np
 import pandas as pd
-import yfinance as yf
 import matplotlib.pyplot as plt
 from scipy.stats import norm
+from MarketData import get_prices
 
 class StockData:
-    def __init__(self, ticker, start_date, end_date):
+    def __init__(self, ticker, start_date, end_date, store=None):
         self.data = None
         self.ticker = ticker
         self.start_date = start_date
         self.end_date = end_date
+        # MarketData.PriceStore to read prices from, None uses the shared on-disk cache
+        self.store = store
         
     def plot_prices(self):
         self.data.plot(ylabel='USD', xlabel='Date')
         plt.show()
 
     def download_data(self):
-        self.data = yf.download(self.ticker, start=self.start_date, end=self.end_date, auto_adjust=False)['Adj Close']
+        self.data = get_prices(self.ticker, self.start_date, self.end_date, self.store)
     def calculate_log_daily_returns(self):
         self.returns = np.log(self.data / self.data.shift(1))
         self.returns = self.returns[1:]
@@ -1,19 +1,83 @@
+import time
 import numpy as np
-from numpy.random import normal
 import matplotlib.pyplot as plt
+import StochasticProcesses
 
-def generate_process(x0=.5, dt=0.1, theta=1.2, mu=0.5, sigma=0.3, n=200):
-    x = np.zeros(n+1)
-    x[0] = x0
+# returns (t, x) where x has shape (n+1,), or (num_paths, n+1) with one row per path when num_paths is given
+# rng can be a numpy Generator or QuasiMonteCarlo.SobolNormals, by default the global np.random state is used
+def generate_process(x0=.5, dt=0.1, theta=1.2, mu=0.5, sigma=0.3, n=200, num_paths=None, rng=None):
+    # exact AR(1) transition x(t+dt) = mu + (x(t) - mu) * exp(-theta*dt) + noise, for all paths at once
+    process = StochasticProcesses.OrnsteinUhlenbeck(theta, mu, sigma)
+    t, x = StochasticProcesses.simulate(process, x0, n*dt, n, 1 if num_paths is None else num_paths, rng)
 
-    for t in range(1, n+1):
-        x[t] = x[t-1] + theta * (mu - x[t-1]) * dt + sigma * normal(0, np.sqrt(dt))
+    return t, x[0] if num_paths is None else x
+
+# maximum likelihood estimates of theta, mu and sigma for every series in X, observed every dt along axis: by default
+# the last one, so X is (N x T) with one row per series as generate_process returns them (a single series can be a
+# vector); axis=0 takes a (T x N) matrix with one column per series
+# the exact transition is the AR(1) regression x(t+dt) = a + b x(t) + e with e ~ N(0, s^2), where
+#   b = exp(-theta*dt), a = mu * (1 - b), s^2 = sigma^2 * (1 - b^2) / (2*theta)
+# so the MLE is ordinary least squares, done for all columns at once from their sums
+# returns a dict of arrays with one entry per series: 'theta', 'mu', 'sigma', 'half_life' and their standard errors
+# 'theta_se', 'mu_se', 'sigma_se', 'half_life_se' (asymptotic, by the delta method); series that do not mean
+# revert (b outside (0, 1)) get NaN
+def calibrate(X, dt, axis=-1):
+    X = np.moveaxis(np.asarray(X, dtype=np.float64), axis, -1)
+    x, y = X[..., :-1], X[..., 1:]
+    n = x.shape[-1]
+
+    mean_x, mean_y = x.mean(axis=-1), y.mean(axis=-1)
+    var_x = (x ** 2).mean(axis=-1) - mean_x ** 2
+    cov_xy = (x * y).mean(axis=-1) - mean_x * mean_y
+    b = cov_xy / var_x
+    a = mean_y - b * mean_x
+    # MLE of the residual variance (divided by n), mean(e^2) = var(y) - b cov(x, y)
+    s2 = np.maximum((y ** 2).mean(axis=-1) - mean_y ** 2 - b * cov_xy, 0)
+
+    # covariance of (a, b) is s^2 (X'X)^-1 with X'X = n [[1, mean_x], [mean_x, mean_x^2 + var_x]]
+    var_b = s2 / (n * var_x)
+    var_a = var_b * (mean_x ** 2 + var_x)
+    cov_ab = -var_b * mean_x
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        b = np.where((b > 0) & (b < 1), b, np.nan)
+        theta = -np.log(b) / dt
+        mu = a / (1 - b)
+        g = 2 * theta / (1 - b ** 2)
+        sigma = np.sqrt(s2 * g)
+        half_life = np.log(2) / theta
+
+        theta_se = np.sqrt(var_b) / (b * dt)
+        # mu = a / (1-b): d/da = 1/(1-b), d/db = a/(1-b)^2
+        mu_se = np.sqrt(var_a / (1 - b) ** 2 + 2 * cov_ab * a / (1 - b) ** 3 + var_b * a ** 2 / (1 - b) ** 4)
+        # sigma = sqrt(s^2 g(b)) with s^2 asymptotically independent of b and var(s^2) = 2 s^4 / n
+        dg_db = -2 / (b * dt * (1 - b ** 2)) + 4 * theta * b / (1 - b ** 2) ** 2
+        sigma_se = sigma * np.sqrt(0.5 / n + var_b * (dg_db / (2 * g)) ** 2)
+        half_life_se = half_life * theta_se / theta
+
+    return {'theta': theta, 'mu': mu, 'sigma': sigma, 'half_life': half_life,
+            'theta_se': theta_se, 'mu_se': mu_se, 'sigma_se': sigma_se, 'half_life_se': half_life_se}
+
+def benchmark_calibration(num_series=10000, num_days=2520, theta=5.0, mu=0.5, sigma=0.3):
+    rng = np.random.default_rng(0)
+    dt = 1 / 252
+    _, x = generate_process(mu, dt, theta, mu, sigma, num_days - 1, num_paths=num_series, rng=rng)
+
+    start = time.perf_counter()
+    estimates = calibrate(x, dt)
+    elapsed = time.perf_counter() - start
+
+    print('%d series x %d observations calibrated in %.3fs' % (num_series, num_days, elapsed))
+    for name, true in (('theta', theta), ('mu', mu), ('sigma', sigma)):
+        # the standard errors should match the spread of the estimates across series
+        print('%-6s true %.4f  mean estimate %.4f  spread %.4f  mean standard error %.4f'
+              % (name, true, np.nanmean(estimates[name]), np.nanstd(estimates[name]), np.nanmean(estimates[name + '_se'])))
+
+if __name__ == '__main__':
+    t, x = generate_process()
 
-    t = np.linspace(0, n*dt, n+1)
-    
     plt.figure(figsize=(10,6))
     plt.plot(t, x)
     plt.show()
 
-if __name__ == '__main__':
-    generate_process()
\ No newline at end of file
+    benchmark_calibration()
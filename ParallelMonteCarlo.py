@@ -0,0 +1,95 @@
+import os
+import time
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from RunningStatistics import RunningStatistics
+from MonteCarloOptionPricing import OptionsPricing
+
+# number of samples each worker draws at a time
+BATCH_SIZE = 100000
+
+# Every simulator in this project can take an rng argument: either the global np.random state or a numpy Generator.
+# The executor hands each worker its own Generator spawned from one SeedSequence, so the streams are
+# statistically independent and the result only depends on (seed, num_workers), never on process scheduling.
+
+def split_samples(num_samples, num_workers):
+    # as even a split as possible, the first workers take one extra sample when it does not divide exactly
+    base, extra = divmod(num_samples, num_workers)
+    return [base + (i < extra) for i in range(num_workers)]
+
+def _run_worker(task, seed_sequence, num_samples):
+    return task(np.random.default_rng(seed_sequence), num_samples)
+
+def parallel_run(task, num_samples, num_workers=None, seed=None):
+    # task(rng, n) is run once per worker on that worker's share of the sample budget
+    # it must be picklable (a module level function, a partial of one, or a bound method)
+    # results come back in worker order so any reduction over them is deterministic
+    num_workers = os.cpu_count() if num_workers is None else num_workers
+    seeds = np.random.SeedSequence(seed).spawn(num_workers)
+    sizes = split_samples(num_samples, num_workers)
+
+    if num_workers == 1:
+        return [_run_worker(task, seeds[0], sizes[0])]
+    with ProcessPoolExecutor(max_workers=num_workers) as pool:
+        return list(pool.map(_run_worker, [task] * num_workers, seeds, sizes))
+
+def _mean_task(sampler, batch_size, rng, num_samples):
+    stats = RunningStatistics()
+    for start in range(0, num_samples, batch_size):
+        stats.update(sampler(rng, min(batch_size, num_samples - start)))
+    return stats
+
+def parallel_mean(sampler, num_samples, num_workers=None, seed=None, batch_size=BATCH_SIZE):
+    # sampler(rng, n) returns n independent samples whose mean is the quantity being estimated
+    # each worker returns its count, mean and sum of squared deviations which are merged exactly
+    # (Chan's pairwise update) rather than by averaging the workers' averages
+    # returns (estimate, standard error)
+    results = parallel_run(partial(_mean_task, sampler, batch_size), num_samples, num_workers, seed)
+    total = RunningStatistics()
+    for stats in results:
+        total.merge(stats)
+    return total.mean, total.std_error()
+
+def _lower_tail_task(sampler, k, batch_size, rng, num_samples):
+    # keep only the k smallest samples seen so far
+    tail = np.empty(0)
+    for start in range(0, num_samples, batch_size):
+        tail = np.concatenate((tail, sampler(rng, min(batch_size, num_samples - start))))
+        if tail.size > k:
+            tail = np.partition(tail, k - 1)[:k]
+    return tail
+
+def parallel_lower_quantile(sampler, q, num_samples, num_workers=None, seed=None, batch_size=BATCH_SIZE):
+    # the q-quantile (q < 0.5) of all samples, identical to np.quantile on the full sample set
+    # np.quantile interpolates between the order statistics floor((n-1)q) and the one after it,
+    # both of which are among the k smallest samples of the worker that drew them
+    k = int(np.floor((num_samples - 1) * q)) + 2
+    tails = parallel_run(partial(_lower_tail_task, sampler, k, batch_size), num_samples, num_workers, seed)
+    tail = np.sort(np.concatenate(tails))
+
+    position = (num_samples - 1) * q
+    lower = int(np.floor(position))
+    # clamped like np.quantile when the position is the last order statistic kept (e.g. a single sample)
+    upper = min(lower + 1, len(tail) - 1)
+    return tail[lower] + (position - lower) * (tail[upper] - tail[lower])
+
+def benchmark_scaling(max_workers=None, num_samples=20000000, seed=42):
+    max_workers = os.cpu_count() if max_workers is None else max_workers
+    op = OptionsPricing(100, 100, 1, 0.05, 0.2, num_samples)
+    sampler = partial(op.sample_payoffs, option_type='call')
+
+    worker_counts = [1]
+    while worker_counts[-1] < max_workers:
+        worker_counts.append(min(2 * worker_counts[-1], max_workers))
+
+    base_time = None
+    for workers in worker_counts:
+        start = time.perf_counter()
+        price, std_error = parallel_mean(sampler, num_samples, workers, seed)
+        elapsed = time.perf_counter() - start
+        base_time = elapsed if base_time is None else base_time
+        print('%3d workers: £%.5f +/- %.5f in %.2fs (speed-up %.1fx)' % (workers, price, std_error, elapsed, base_time / elapsed))
+
+if __name__ == '__main__':
+    benchmark_scaling()
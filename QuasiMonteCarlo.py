@@ -0,0 +1,130 @@
+import time
+import numpy as np
+from scipy.stats import qmc
+from scipy.special import ndtri
+from BlackScholes import call_option_price
+from GeometricBrownianMotion import simulate_geometric_random_walk
+from BondPricingVasicek import monte_carlo_simulation
+from MonteCarloOptionPricing import OptionsPricing
+
+# keeps uniforms away from 0 and 1 before mapping them to normals
+UNIFORM_EPSILON = 1e-12
+
+def brownian_bridge_order(num_steps):
+    # order in which the bridge fills in the time grid: W_T first, then the midpoint, then the quarter points, ...
+    # each entry is (index, left, right): W[index] is drawn conditionally on W[left] and W[right]
+    order = [(num_steps, 0, None)]
+    intervals = [(0, num_steps)]
+    for left, right in intervals:
+        if right - left > 1:
+            middle = (left + right) // 2
+            order.append((middle, left, right))
+            intervals += [(left, middle), (middle, right)]
+    return order
+
+def brownian_bridge_matrix(num_steps, T=1):
+    # matrix B such that W = Z @ B turns rows of independent normals Z (paths x num_steps) into
+    # Brownian motion sampled at t_1, ..., t_N with the bridge ordering, i.e. column k of Z drives the
+    # k-th point of brownian_bridge_order, so the first (best distributed) Sobol dimensions carry
+    # most of the variance of the path
+    t = np.linspace(0, T, num_steps+1)
+    # row i holds the coefficients of W(t_i) in terms of the normals, W(0) = 0
+    coefficients = np.zeros((num_steps+1, num_steps))
+    for k, (index, left, right) in enumerate(brownian_bridge_order(num_steps)):
+        if right is None:
+            coefficients[index, k] = np.sqrt(t[index] - t[left])
+            continue
+        # W(t_m) given W(t_l), W(t_r) is normal with mean linearly interpolated between them
+        # and variance (t_m - t_l)(t_r - t_m)/(t_r - t_l)
+        weight = (t[index] - t[left]) / (t[right] - t[left])
+        coefficients[index] = (1 - weight) * coefficients[left] + weight * coefficients[right]
+        coefficients[index, k] += np.sqrt((t[index] - t[left]) * (t[right] - t[index]) / (t[right] - t[left]))
+    return coefficients[1:].T
+
+class SobolNormals:
+    # stands in for np.random / a numpy Generator in the simulators of this project (random, standard_normal, normal)
+    # standard_normal(n) gives n one dimensional Sobol normals (e.g. terminal prices in OptionsPricing)
+    # standard_normal((paths, steps)) gives a row of Brownian increments per path, divided by sqrt(dt)
+    # so they look like independent N(0,1) draws, but built with a Brownian bridge from steps-dimensional Sobol points
+    # successive calls continue the same Sobol sequence, so simulators that draw paths in chunks stay low-discrepancy
+    # any n can be asked for: the Sobol points are only balanced in blocks of a power of two, so points are drawn
+    # until a power of two have been drawn in total and the ones not used are handed out by the next call;
+    # the points returned so far are a balanced set whenever their total is a power of two
+    def __init__(self, seed=None, scramble=True, bridge=True):
+        self.seed = np.random.default_rng(seed)
+        self.scramble = scramble
+        self.bridge = bridge
+        self._engines = {}
+        self._surplus = {}
+        self._bridges = {}
+
+    def _uniforms(self, n, d):
+        if d not in self._engines:
+            self._engines[d] = qmc.Sobol(d, scramble=self.scramble, seed=self.seed)
+            self._surplus[d] = np.empty((0, d))
+        engine, surplus = self._engines[d], self._surplus[d]
+        if len(surplus) < n:
+            total = engine.num_generated + n - len(surplus)
+            surplus = np.concatenate((surplus, engine.random(2 ** int(np.ceil(np.log2(total))) - engine.num_generated)))
+        u, self._surplus[d] = surplus[:n], surplus[n:]
+        return np.clip(u, UNIFORM_EPSILON, 1 - UNIFORM_EPSILON)
+
+    def random(self, size):
+        n, d = (size, 1) if np.ndim(size) == 0 else size
+        u = self._uniforms(n, d)
+        return u[:, 0] if np.ndim(size) == 0 else u
+
+    def standard_normal(self, size):
+        n, d = (size, 1) if np.ndim(size) == 0 else size
+        z = ndtri(self._uniforms(n, d))
+        if np.ndim(size) == 0:
+            return z[:, 0]
+        if self.bridge and d > 1:
+            if d not in self._bridges:
+                self._bridges[d] = brownian_bridge_matrix(d, T=d)
+            # unit time steps, so the increments of W are already standard normal
+            W = z @ self._bridges[d]
+            z = np.diff(W, axis=1, prepend=0)
+        return z
+
+    def normal(self, loc=0.0, scale=1.0, size=None):
+        return loc + scale * self.standard_normal(size)
+
+def rqmc_estimate(estimator, num_replicates=16, seed=None, **kwargs):
+    # randomized QMC: the same estimator run on independently scrambled Sobol sequences
+    # the replicates are i.i.d. unbiased estimates so their spread gives an honest error bar
+    # estimator(rng) returns a scalar estimate; returns (estimate, standard error)
+    seeds = np.random.SeedSequence(seed).spawn(num_replicates)
+    estimates = np.array([estimator(SobolNormals(seed=s, **kwargs)) for s in seeds])
+    return estimates.mean(), estimates.std(ddof=1) / np.sqrt(num_replicates)
+
+def benchmark_qmc(S0=100, E=100, T=1, rf=0.05, sigma=0.2, num_steps=64, repeats=10):
+    # European call priced from full GBM paths, so the path dimension is num_steps
+    # prints RMS error against the Black-Scholes price and the wall time for pseudo-random and Sobol + bridge paths
+    exact = call_option_price(S0, E, T, rf, sigma)
+
+    def price(rng, num_paths):
+        _, S = simulate_geometric_random_walk(S0, T, num_steps, rf, sigma, num_paths=num_paths, rng=rng)
+        return np.exp(-rf * T) * np.mean(np.maximum(S[:, -1] - E, 0))
+
+    print('%8s %22s %22s' % ('paths', 'pseudo-random rmse/s', 'sobol+bridge rmse/s'))
+    for power in range(10, 17, 2):
+        num_paths = 2 ** power
+        row = []
+        for make_rng in (np.random.default_rng, SobolNormals):
+            start = time.perf_counter()
+            errors = [price(make_rng(seed), num_paths) - exact for seed in range(repeats)]
+            elapsed = (time.perf_counter() - start) / repeats
+            row.append('%.5f / %.4fs' % (np.sqrt(np.mean(np.square(errors))), elapsed))
+        print('%8d %22s %22s' % (num_paths, row[0], row[1]))
+
+if __name__ == '__main__':
+    op = OptionsPricing(100, 100, 1, 0.05, 0.2, 2 ** 14)
+    price, std_error = rqmc_estimate(lambda rng: np.mean(op.sample_payoffs(rng, op.iterations)))
+    print('RQMC call price £%.5f +/- %.5f (Black-Scholes £%.5f)' % (price, std_error, call_option_price(100, 100, 1, 0.05, 0.2)))
+
+    price, std_error = rqmc_estimate(lambda rng: monte_carlo_simulation(1000, 0.1, 0.3, 0.3, 0.03, num_simulations=2 ** 12,
+                                                                        num_points=64, store_paths=False, rng=rng)[0])
+    print('RQMC Vasicek bond price £%.4f +/- %.4f' % (price, std_error))
+
+    benchmark_qmc()
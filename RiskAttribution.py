@@ -0,0 +1,191 @@
+import time
+import numpy as np
+from scipy.stats import norm
+from MonteCarloVaR import PortfolioVaR
+
+# VaR and ES are homogeneous of degree one in the positions, so by Euler's theorem they split exactly into
+# component contributions w_i * dVaR/dw_i that add up to the portfolio figure
+# every contribution comes out of one covariance matrix or one scenario set, never one re-run per position
+
+class ParametricAttribution:
+    # delta-normal VaR and ES of a portfolio and their split across positions
+    # positions are the amounts invested in each asset, mu and cov the mean vector and covariance matrix
+    # of their daily returns, n the horizon in days
+    # with sigma_p = sqrt(w' cov w) and everything scaled to the horizon:
+    #   VaR = z sigma_p - w'mu,   dVaR/dw = z (cov w) / sigma_p - mu
+    #   ES = sigma_p phi(z) / (1-c) - w'mu,   dES/dw = phi(z) / (1-c) (cov w) / sigma_p - mu
+    def __init__(self, positions, mu, cov, confidences=(0.95, 0.99), n=1):
+        self.positions = np.asarray(positions, dtype=np.float64)
+        self.mu = np.asarray(mu, dtype=np.float64) * n
+        self.cov = np.asarray(cov, dtype=np.float64) * n
+        self.confidences = np.atleast_1d(np.asarray(confidences, dtype=np.float64))
+        z = norm.ppf(self.confidences)
+        # multiples of sigma_p giving VaR and ES at every confidence level
+        self.var_multiple = z[:, None]
+        self.es_multiple = (norm.pdf(z) / (1 - self.confidences))[:, None]
+
+        # cov w is the only O(N^2) step, every other figure is read from it
+        self.cov_w = self.cov @ self.positions
+        self.variance = self.positions @ self.cov_w
+        self.mean = self.positions @ self.mu
+
+    def attribution(self):
+        # returns {'var', 'es'} with one entry per confidence level and
+        # {'marginal_var', 'component_var', 'marginal_es', 'component_es'} of shape (confidences x positions)
+        sigma = np.sqrt(self.variance)
+        beta = self.cov_w / sigma
+        marginal_var = self.var_multiple * beta - self.mu
+        marginal_es = self.es_multiple * beta - self.mu
+        return {'var': self.var_multiple[:, 0] * sigma - self.mean,
+                'es': self.es_multiple[:, 0] * sigma - self.mean,
+                'marginal_var': marginal_var, 'component_var': marginal_var * self.positions,
+                'marginal_es': marginal_es, 'component_es': marginal_es * self.positions}
+
+    def incremental(self, indices, amounts):
+        # change in VaR and ES from trading amounts in the assets at indices, without touching the other columns:
+        #   (w + d)' cov (w + d) = w' cov w + 2 d'(cov w) + d' cov d   with d nonzero only at indices
+        # amounts is (indices,) for one proposed trade or (trades x indices) for several trades in the same assets
+        # returns (change in VaR, change in ES), each (confidences,) or (trades x confidences)
+        indices = np.atleast_1d(indices)
+        amounts = np.asarray(amounts, dtype=np.float64)
+        trades = np.atleast_2d(amounts)
+        block = self.cov[np.ix_(indices, indices)]
+        variance = self.variance + 2 * trades @ self.cov_w[indices] + np.einsum('ti,ij,tj->t', trades, block, trades)
+        mean = self.mean + trades @ self.mu[indices]
+
+        old_sigma, new_sigma = np.sqrt(self.variance), np.sqrt(variance)[:, None]
+        var = self.var_multiple[:, 0] * (new_sigma - old_sigma) - (mean - self.mean)[:, None]
+        es = self.es_multiple[:, 0] * (new_sigma - old_sigma) - (mean - self.mean)[:, None]
+        return (var, es) if amounts.ndim > 1 else (var[0], es[0])
+
+class SimulatedAttribution:
+    # VaR and ES of a portfolio and their split across positions from one set of simulated (or historical) scenarios
+    # returns is a (scenarios x assets) matrix of the simple return of every asset in every scenario,
+    # so the P&L of position i in a scenario is positions[i] * returns[:, i]
+    # the contribution of a position to ES is minus its average P&L over the m worst scenarios, and to VaR minus its
+    # average P&L over the scenarios ranked around the m-th worst, an estimate of E[pnl_i | loss = VaR], rescaled so
+    # the contributions add up to VaR exactly (the window average only does so up to the spread of its losses)
+    # returns may hold only the worst scenarios (e.g. PortfolioVaR.tail_scenarios, worst first), in which case
+    # iterations is the number of scenarios they were taken from
+    def __init__(self, positions, returns, confidences=(0.95, 0.99), iterations=None, bandwidth=None):
+        self.positions = np.asarray(positions, dtype=np.float64)
+        self.returns = np.asarray(returns, dtype=np.float64)
+        self.confidences = np.atleast_1d(np.asarray(confidences, dtype=np.float64))
+        self.iterations = len(self.returns) if iterations is None else iterations
+        self.complete = self.iterations == len(self.returns)
+        # m = ceil((1-c) * iterations) worst scenarios at every confidence level
+        self.tail_counts = np.maximum(np.ceil((1 - self.confidences) * self.iterations - 1e-6).astype(int), 1)
+        if self.tail_counts.max() > len(self.returns):
+            raise ValueError('need the %d worst scenarios, only %d were given' % (self.tail_counts.max(), len(self.returns)))
+        # half width of the window of ranks around the m-th worst scenario averaged for component VaR
+        self.bandwidth = bandwidth
+
+        self.losses = -(self.returns @ self.positions)
+        # scenarios ordered from the worst loss, only as many as the largest tail needs plus the VaR window
+        depth = min(len(self.losses), self.tail_counts.max() + self._bandwidth(self.tail_counts.max()) + 1)
+        worst = np.argpartition(self.losses, len(self.losses) - depth)[-depth:]
+        self.order = worst[np.argsort(self.losses[worst])[::-1]]
+
+    def _bandwidth(self, m):
+        return int(np.sqrt(m)) if self.bandwidth is None else self.bandwidth
+
+    def attribution(self):
+        # same dictionary as ParametricAttribution.attribution()
+        tail_pnl = self.returns[self.order] * self.positions
+        tail_losses = self.losses[self.order]
+        var, es, component_var, component_es = [], [], [], []
+        for m in self.tail_counts:
+            # the same number of ranks on either side of the m-th worst, so a window cut short by the start of the
+            # ranking or the end of the scenarios given does not lean to one side of VaR
+            h = min(self._bandwidth(m), m - 1, len(tail_losses) - m)
+            window = slice(m - 1 - h, m + h)
+            var.append(tail_losses[m - 1])
+            es.append(tail_losses[:m].mean())
+            contributions = -tail_pnl[window].mean(axis=0)
+            total = contributions.sum()
+            component_var.append(contributions * var[-1] / total if total != 0 else contributions)
+            component_es.append(-tail_pnl[:m].mean(axis=0))
+
+        component_var, component_es = np.array(component_var), np.array(component_es)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            marginal_var, marginal_es = component_var / self.positions, component_es / self.positions
+        return {'var': np.array(var), 'es': np.array(es),
+                'marginal_var': marginal_var, 'component_var': component_var,
+                'marginal_es': marginal_es, 'component_es': component_es}
+
+    def incremental(self, indices, amounts):
+        # change in VaR and ES from trading amounts in the assets at indices; only those columns of the scenario
+        # matrix are read: new losses = losses - returns[:, indices] @ amounts
+        # amounts is (indices,) for one proposed trade or (trades x indices) for several trades in the same assets
+        # returns (change in VaR, change in ES), each (confidences,) or (trades x confidences)
+        if not self.complete:
+            raise ValueError('incremental VaR needs every scenario, a trade can move scenarios into the tail')
+        indices = np.atleast_1d(indices)
+        amounts = np.asarray(amounts, dtype=np.float64)
+        trades = np.atleast_2d(amounts)
+        base = self.attribution()
+
+        var, es = np.empty((len(trades), len(self.confidences))), np.empty((len(trades), len(self.confidences)))
+        for t, trade in enumerate(trades):
+            losses = self.losses - self.returns[:, indices] @ trade
+            top = self.tail_counts.max()
+            worst = np.sort(np.partition(losses, len(losses) - top)[-top:])[::-1]
+            var[t] = worst[self.tail_counts - 1] - base['var']
+            es[t] = np.cumsum(worst)[self.tail_counts - 1] / self.tail_counts - base['es']
+        return (var, es) if amounts.ndim > 1 else (var[0], es[0])
+
+def attribution_from_portfolio_var(portfolio, bandwidth=None):
+    # component VaR and ES of a PortfolioVaR after simulation(), from the tail scenarios it kept
+    # (its scenarios are P&L over the horizon, divided by the positions to get returns)
+    returns = portfolio.tail_scenarios / portfolio.positions
+    engine = SimulatedAttribution(portfolio.positions, returns, portfolio.confidences, portfolio.iterations, bandwidth)
+    return engine.attribution()
+
+def benchmark_attribution(num_positions=2000, num_scenarios=100000):
+    rng = np.random.default_rng(0)
+    # one factor covariance matrix
+    loadings = rng.uniform(0.5, 1.5, num_positions) * 0.01
+    cov = np.outer(loadings, loadings) + np.diag(rng.uniform(0.005, 0.02, num_positions) ** 2)
+    mu = np.full(num_positions, 0.0003)
+    positions = rng.uniform(1e3, 1e5, num_positions)
+
+    start = time.perf_counter()
+    parametric = ParametricAttribution(positions, mu, cov)
+    result = parametric.attribution()
+    print('parametric attribution of %d positions in %.3fs, components add up to VaR within %.2e'
+          % (num_positions, time.perf_counter() - start, np.max(np.abs(result['component_var'].sum(axis=1) - result['var']))))
+
+    start = time.perf_counter()
+    dvar, des = parametric.incremental([0, 1, 2], rng.normal(0, 1e4, (1000, 3)))
+    print('1000 proposed trades in 3 assets in %.3fs' % (time.perf_counter() - start))
+
+    returns = rng.multivariate_normal(mu, cov, num_scenarios, method='cholesky')
+    start = time.perf_counter()
+    simulated = SimulatedAttribution(positions, returns)
+    result = simulated.attribution()
+    print('simulated attribution of %d positions over %d scenarios in %.3fs, component ES adds up to ES within %.2e'
+          % (num_positions, num_scenarios, time.perf_counter() - start, np.max(np.abs(result['component_es'].sum(axis=1) - result['es']))))
+    print('simulated / parametric VaR: %s' % (result['var'] / parametric.attribution()['var']).round(3))
+
+    start = time.perf_counter()
+    simulated.incremental([0, 1, 2], rng.normal(0, 1e4, (10, 3)))
+    print('10 proposed trades against %d scenarios in %.3fs' % (num_scenarios, time.perf_counter() - start))
+
+if __name__ == '__main__':
+    positions = np.array([4e5, 3e5, 3e5])
+    vols = np.array([0.02, 0.015, 0.01])
+    correlation = np.array([[1.0, 0.6, 0.3], [0.6, 1.0, 0.4], [0.3, 0.4, 1.0]])
+    mu, cov = np.full(3, 0.0003), correlation * np.outer(vols, vols)
+
+    result = ParametricAttribution(positions, mu, cov).attribution()
+    print('Parametric 1-day VaR at 95/99:', result['var'].round(2))
+    print('Component VaR:', result['component_var'].round(2))
+
+    portfolio = PortfolioVaR(positions, [0.95, 0.99], mu, cov, 1, 1000000)
+    portfolio.simulation(np.random.default_rng(0))
+    result = attribution_from_portfolio_var(portfolio)
+    print('Monte Carlo 1-day VaR at 95/99:', result['var'].round(2))
+    print('Component VaR:', result['component_var'].round(2))
+    print('Component ES:', result['component_es'].round(2))
+
+    benchmark_attribution()
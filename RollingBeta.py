@@ -0,0 +1,136 @@
+import time
+import numpy as np
+from scipy.signal import lfilter
+
+# number of stocks processed together by fit, bounds the temporary arrays at (days x COLUMN_BLOCK)
+COLUMN_BLOCK = 500
+
+class RollingBeta:
+    # CAPM beta, alpha, residual volatility and R^2 of many stocks against one market series, kept up to date
+    # from running sums of x, x^2, y, y^2 and xy (x = market return, y = stock return) instead of refitting
+    # a regression for every window, so every new day costs O(1) per stock
+    # either window (rolling window of that many observations) or halflife (exponential weights) must be given
+    # pass excess returns (returns minus the risk free rate) to get the alpha of the CAPM regression
+    def __init__(self, window=None, halflife=None):
+        if (window is None) == (halflife is None):
+            raise ValueError('give exactly one of window and halflife')
+        self.window = window
+        # weight of an observation halves every halflife observations
+        self.decay = None if halflife is None else 0.5 ** (1 / halflife)
+        self.sums = None
+
+    @staticmethod
+    def _statistics(n, sx, sxx, sy, syy, sxy):
+        # regression statistics from the (weighted) sums, broadcast over any shape
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean_x, mean_y = sx / n, sy / n
+            var_x = sxx / n - mean_x ** 2
+            var_y = syy / n - mean_y ** 2
+            cov = sxy / n - mean_x * mean_y
+            beta = cov / var_x
+            alpha = mean_y - beta * mean_x
+            r_squared = cov ** 2 / (var_x * var_y)
+            residual_volatility = np.sqrt(np.maximum(var_y - beta * cov, 0))
+        return beta, alpha, residual_volatility, r_squared
+
+    def _window_sums(self, returns, market):
+        # running sums for every day at once: differences of cumulative sums for a rolling window,
+        # a first order recursive filter (S_t = decay * S_t-1 + x_t) for exponential weights
+        market = market[:, None]
+        terms = (np.ones_like(market), market, market ** 2, returns, returns ** 2, returns * market)
+        sums = []
+        for term in terms:
+            if self.decay is None:
+                cumulative = np.cumsum(np.concatenate((np.zeros((1, term.shape[1])), term)), axis=0)
+                lagged = np.zeros_like(cumulative[1:])
+                lagged[self.window:] = cumulative[1:-self.window]
+                sums.append(cumulative[1:] - lagged)
+            else:
+                sums.append(lfilter([1], [1, -self.decay], term, axis=0))
+        return sums
+
+    def fit(self, returns, market, dtype=np.float64):
+        # returns is a (days x stocks) matrix and market a vector of the same number of days
+        # returns (beta, alpha, residual volatility, R^2), each (days x stocks); rows before a full window are NaN
+        # afterwards append() carries on from the last day
+        returns = np.asarray(returns, dtype=np.float64)
+        market = np.asarray(market, dtype=np.float64)
+        num_days, num_stocks = returns.shape
+        outputs = [np.empty((num_days, num_stocks), dtype=dtype) for _ in range(4)]
+
+        for start in range(0, num_stocks, COLUMN_BLOCK):
+            block = slice(start, min(start + COLUMN_BLOCK, num_stocks))
+            sums = self._window_sums(returns[:, block], market)
+            for output, statistic in zip(outputs, self._statistics(*sums)):
+                output[:, block] = statistic
+        if self.window is not None:
+            for output in outputs:
+                output[:self.window - 1] = np.nan
+
+        self._reset(returns, market)
+        return tuple(outputs)
+
+    def _reset(self, returns, market):
+        # state for append(): the sums over the current window and, for a rolling window, the window itself
+        if self.decay is None:
+            self.buffer_returns = np.array(returns[-self.window:])
+            self.buffer_market = np.array(market[-self.window:])
+            # position in the circular buffer of the oldest observation
+            self.position = 0
+            m, r = self.buffer_market, self.buffer_returns
+            self.sums = [float(len(m)), m.sum(), (m ** 2).sum(), r.sum(axis=0), (r ** 2).sum(axis=0), (r * m[:, None]).sum(axis=0)]
+        elif len(market) == 0:
+            self.sums = [0.0, 0.0, 0.0] + [np.zeros(returns.shape[1]) for _ in range(3)]
+        else:
+            self.sums = [s[-1] for s in self._window_sums(returns, market)]
+            self.sums[:3] = [float(s[0]) for s in self.sums[:3]]
+
+    def append(self, stock_returns, market_return):
+        # add one day of returns for every stock, O(1) work per stock
+        # returns (beta, alpha, residual volatility, R^2) for the window ending on this day
+        stock_returns = np.asarray(stock_returns, dtype=np.float64)
+        if self.sums is None:
+            # nothing fitted yet: start from empty sums
+            self._reset(np.empty((0, stock_returns.size)), np.empty(0))
+
+        new = [1.0, market_return, market_return ** 2, stock_returns, stock_returns ** 2, stock_returns * market_return]
+        if self.decay is not None:
+            self.sums = [self.decay * s + x for s, x in zip(self.sums, new)]
+        elif len(self.buffer_market) < self.window:
+            self.sums = [s + x for s, x in zip(self.sums, new)]
+            self.buffer_returns = np.vstack((self.buffer_returns, stock_returns))
+            self.buffer_market = np.append(self.buffer_market, market_return)
+        else:
+            # the oldest day leaves the window as the new one enters, and takes its place in the buffer
+            old_returns, old_market = self.buffer_returns[self.position], self.buffer_market[self.position]
+            old = [1.0, old_market, old_market ** 2, old_returns, old_returns ** 2, old_returns * old_market]
+            self.sums = [s + x - o for s, x, o in zip(self.sums, new, old)]
+            self.buffer_returns[self.position] = stock_returns
+            self.buffer_market[self.position] = market_return
+            self.position = (self.position + 1) % self.window
+
+        return self._statistics(*self.sums)
+
+def benchmark_rolling_beta(num_stocks=5000, num_years=20, window=252):
+    rng = np.random.default_rng(0)
+    num_days = 252 * num_years
+    market = rng.normal(0.0003, 0.01, num_days)
+    betas = rng.uniform(0.5, 1.5, num_stocks)
+    returns = market[:, None] * betas + rng.normal(0, 0.015, (num_days, num_stocks))
+
+    start = time.perf_counter()
+    engine = RollingBeta(window=window)
+    beta, alpha, residual_volatility, r_squared = engine.fit(returns, market, dtype=np.float32)
+    fit_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(20):
+        engine.append(returns[-1], market[-1])
+    append_time = (time.perf_counter() - start) / 20
+
+    print('%d stocks x %d days of %d-day rolling betas in %.2fs' % (num_stocks, num_days, window, fit_time))
+    print('daily append for all %d stocks: %.2fms' % (num_stocks, append_time * 1000))
+    print('mean absolute beta error on the last day: %.4f' % np.mean(np.abs(beta[-1] - betas)))
+
+if __name__ == '__main__':
+    benchmark_rolling_beta()
@@ -0,0 +1,36 @@
+import numpy as np
+
+class RunningStatistics:
+    # running mean and variance of a stream of samples (Welford's algorithm)
+    # batches are merged with Chan's parallel update so the result does not depend on how the stream was split
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        # sum of squared deviations from the mean
+        self.m2 = 0.0
+
+    def update(self, samples):
+        samples = np.asarray(samples, dtype=np.float64)
+        if samples.size == 0:
+            return self
+        batch = RunningStatistics()
+        batch.count = samples.size
+        batch.mean = samples.mean()
+        batch.m2 = np.sum((samples - batch.mean) ** 2)
+        return self.merge(batch)
+
+    def merge(self, other):
+        count = self.count + other.count
+        if count == 0:
+            return self
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        return self
+
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else np.nan
+
+    def std_error(self):
+        return np.sqrt(self.variance() / self.count) if self.count > 1 else np.inf
@@ -10,14 +10,10 @@ def brownian_bridge(T=1, N=252):
     
     # build standard Brownian motion
     W = np.zeros(N+1)
-    for i in range(1, N+1):
-        Z = np.random.normal()
-        W[i] = W[i-1] + np.sqrt(dt) * Z
+    W[1:] = np.cumsum(np.sqrt(dt) * np.random.normal(size=N))
 
     # Force W_T = 0
-    W_T = W[-1]
-    for i in range(N+1):
-        W[i] = W[i] - (t[i]/T) * W_T
+    W -= (t/T) * W[-1]
     
     return t, W
 
@@ -0,0 +1,160 @@
+import os
+import time
+import tempfile
+import numpy as np
+
+# number of paths simulated together, bounds the working memory at CHUNK_SIZE * (steps + 1) floats
+# whatever the total number of paths; a power of two so Sobol' points drawn chunk by chunk keep their balance
+CHUNK_SIZE = 8192
+
+class Process:
+    # a one dimensional diffusion dX = drift(t, X) dt + diffusion(t, X) dW
+    # subclasses with a known transition density override exact_step, which then has no discretization error
+    # however coarse the time grid; paths() steps any process forward one step at a time and can be overridden
+    # by processes whose whole path follows from a cumulative sum of the increments
+    def drift(self, t, x):
+        raise NotImplementedError
+
+    def diffusion(self, t, x):
+        raise NotImplementedError
+
+    def exact_step(self, x, dt, z):
+        raise NotImplementedError('%s has no exact transition, use method=\'euler\'' % type(self).__name__)
+
+    def euler_step(self, t, x, dt, z):
+        return x + self.drift(t, x) * dt + self.diffusion(t, x) * np.sqrt(dt) * z
+
+    def paths(self, x0, t, z, method='exact', out=None):
+        # z is a (paths x steps) block of standard normals, the result is (paths x steps+1) starting from x0
+        # out is filled in place when given
+        out = np.empty((z.shape[0], z.shape[1] + 1)) if out is None else out
+        out[:, 0] = x0
+        x = out[:, 0]
+        for i in range(z.shape[1]):
+            dt = t[i+1] - t[i]
+            x = self.exact_step(x, dt, z[:, i]) if method == 'exact' else self.euler_step(t[i], x, dt, z[:, i])
+            out[:, i+1] = x
+        return out
+
+class WienerProcess(Process):
+    # arithmetic Brownian motion dX = mu dt + sigma dW, the standard Wiener process by default
+    def __init__(self, mu=0.0, sigma=1.0):
+        self.mu = mu
+        self.sigma = sigma
+
+    def drift(self, t, x):
+        return self.mu
+
+    def diffusion(self, t, x):
+        return self.sigma
+
+    def exact_step(self, x, dt, z):
+        return x + self.mu * dt + self.sigma * np.sqrt(dt) * z
+
+    def paths(self, x0, t, z, method='exact', out=None):
+        # independent increments, so a path is a cumulative sum (the Euler scheme is exact here too)
+        out = np.empty((z.shape[0], z.shape[1] + 1)) if out is None else out
+        dt = np.diff(t)
+        out[:, 0] = x0
+        np.cumsum(self.mu * dt + self.sigma * np.sqrt(dt) * z, axis=1, out=out[:, 1:])
+        out[:, 1:] += out[:, :1]
+        return out
+
+class GeometricBrownianMotion(Process):
+    # dS = mu S dt + sigma S dW, log S is an arithmetic Brownian motion with drift mu - sigma^2/2
+    def __init__(self, mu, sigma):
+        self.mu = mu
+        self.sigma = sigma
+
+    def drift(self, t, x):
+        return self.mu * x
+
+    def diffusion(self, t, x):
+        return self.sigma * x
+
+    def exact_step(self, x, dt, z):
+        return x * np.exp((self.mu - 0.5 * self.sigma ** 2) * dt + self.sigma * np.sqrt(dt) * z)
+
+    def paths(self, x0, t, z, method='exact', out=None):
+        if method != 'exact':
+            return Process.paths(self, x0, t, z, method, out)
+        # cumulative sum of the log increments, exponentiated in place
+        out = np.empty((z.shape[0], z.shape[1] + 1)) if out is None else out
+        dt = np.diff(t)
+        out[:, 0] = 0
+        np.cumsum((self.mu - 0.5 * self.sigma ** 2) * dt + self.sigma * np.sqrt(dt) * z, axis=1, out=out[:, 1:])
+        np.exp(out, out=out)
+        out *= np.reshape(x0, (-1, 1)) if np.ndim(x0) else x0
+        return out
+
+class OrnsteinUhlenbeck(Process):
+    # dX = theta (mu - X) dt + sigma dW: mean reversion towards mu at speed theta
+    def __init__(self, theta, mu, sigma):
+        self.speed = theta
+        self.level = mu
+        self.sigma = sigma
+
+    def drift(self, t, x):
+        return self.speed * (self.level - x)
+
+    def diffusion(self, t, x):
+        return self.sigma
+
+    def exact_step(self, x, dt, z):
+        # X(t+dt) given X(t) is normal with mean mu + (X(t) - mu) exp(-theta dt)
+        # and variance sigma^2 (1 - exp(-2 theta dt)) / (2 theta)
+        decay = np.exp(-self.speed * dt)
+        std = self.sigma * np.sqrt((1 - decay ** 2) / (2 * self.speed)) if self.speed > 0 else self.sigma * np.sqrt(dt)
+        return self.level + (x - self.level) * decay + std * z
+
+class Vasicek(OrnsteinUhlenbeck):
+    # short rate model dr = kappa (theta - r) dt + sigma dW, an Ornstein-Uhlenbeck process in the usual rate notation
+    def __init__(self, kappa, theta, sigma):
+        OrnsteinUhlenbeck.__init__(self, kappa, theta, sigma)
+
+def time_grid(T, num_steps, t0=0.0):
+    return np.linspace(t0, t0 + T, num_steps + 1)
+
+def simulate_chunks(process, x0, T, num_steps, num_paths, rng=None, method='exact', chunk_size=CHUNK_SIZE, t0=0.0):
+    # yields (first path, block) with blocks of at most chunk_size paths, each (paths x steps+1) in float64,
+    # for callers that reduce the paths as they go and never need all of them at once
+    # rng can be a numpy Generator or QuasiMonteCarlo.SobolNormals, by default the global np.random state is used;
+    # the whole (paths x steps) block of normals of a chunk is drawn at once
+    rng = np.random if rng is None else rng
+    t = time_grid(T, num_steps, t0)
+    for start in range(0, num_paths, chunk_size):
+        stop = min(start + chunk_size, num_paths)
+        z = rng.standard_normal((stop - start, num_steps))
+        yield start, process.paths(x0, t, z, method)
+
+def simulate(process, x0, T, num_steps, num_paths, rng=None, method='exact', dtype=np.float64, chunk_size=CHUNK_SIZE,
+             out=None, t0=0.0):
+    # returns (t, paths) with paths of shape (num_paths, num_steps+1), one row per path
+    # out can be any array of that shape, e.g. a memory-mapped file from open_paths(); every chunk is written
+    # into it as soon as it is simulated so only chunk_size paths are ever held in memory
+    paths = np.empty((num_paths, num_steps + 1), dtype=dtype) if out is None else out
+    for start, block in simulate_chunks(process, x0, T, num_steps, num_paths, rng, method, chunk_size, t0):
+        paths[start:start + len(block)] = block
+    return time_grid(T, num_steps, t0), paths
+
+def open_paths(filename, num_paths, num_steps, dtype=np.float32):
+    # memory-mapped .npy file to pass to simulate() as out, read back later with np.load(filename, mmap_mode='r')
+    return np.lib.format.open_memmap(filename, mode='w+', dtype=dtype, shape=(num_paths, num_steps + 1))
+
+def benchmark_simulation(num_paths=10**6, num_steps=100):
+    rng = np.random.default_rng(0)
+    processes = (('GBM', GeometricBrownianMotion(0.05, 0.2), 100.0), ('Wiener', WienerProcess(), 0.0),
+                 ('Ornstein-Uhlenbeck', OrnsteinUhlenbeck(1.2, 0.5, 0.3), 0.5))
+    with tempfile.TemporaryDirectory() as directory:
+        for name, process, x0 in processes:
+            filename = os.path.join(directory, 'paths.npy')
+            start = time.perf_counter()
+            out = open_paths(filename, num_paths, num_steps)
+            simulate(process, x0, 1.0, num_steps, num_paths, rng, out=out)
+            out.flush()
+            print('%-18s %d paths x %d steps into a float32 memmap in %.2fs'
+                  % (name, num_paths, num_steps, time.perf_counter() - start))
+            del out
+
+if __name__ == '__main__':
+    benchmark_simulation()
@@ -1,16 +1,16 @@
+import time
 import numpy as np
-import yfinance as yf
-from scipy.stats import norm
+from scipy.stats import norm, chi2
+from scipy.special import xlogy
+from scipy.signal import lfilter
+from numpy.lib.stride_tricks import sliding_window_view
 import pandas as pd
 import datetime
+from MarketData import get_prices, load_returns
 
-def download_data(stock, start_date, end_date):
-    data = {}
-
-    ticker = yf.download(stock, start=start_date, end=end_date, auto_adjust=False)
-    data[stock] = ticker[['Adj Close']].squeeze()
-
-    return pd.DataFrame(data)
+def download_data(stock, start_date, end_date, store=None):
+    # adjusted close prices read through the shared on-disk cache (MarketData.PriceStore)
+    return get_prices(stock, start_date, end_date, store)
 
 # calculate 1-day VaR 
 def calculate_var(position, c, mean, sigma):
@@ -27,14 +27,131 @@ def calculate_var_n_days(position, c, mean, sigma, n):
     var = position * (mean*n - z*sigma*np.sqrt(n))
     return var
 
+# RiskMetrics decay of the exponentially weighted volatility used by filtered historical simulation
+EWMA_LAMBDA = 0.94
+VAR_METHODS = ('parametric', 'historical', 'filtered_historical')
+
+def _tail_counts(confidences, window):
+    # number of worst observations at or beyond the VaR, m = ceil((1-c) * window)
+    return np.maximum(np.ceil((1 - np.asarray(confidences)) * window - 1e-9).astype(int), 1)
+
+def _historical_var_es(losses, confidences):
+    # losses is (windows x window); the order statistics every confidence level needs come out of
+    # one np.partition per window (linear time) instead of sorting each window
+    window = losses.shape[1]
+    m = _tail_counts(confidences, window)
+    partitioned = np.partition(losses, np.unique(window - m), axis=1)
+    var = np.column_stack([partitioned[:, window - k] for k in m])
+    es = np.column_stack([partitioned[:, window - k:].mean(axis=1) for k in m])
+    return var, es
+
+def ewma_volatility(pnl, ewma_lambda=EWMA_LAMBDA, window=250):
+    # forecast of the volatility of day t from the P&L up to day t-1:
+    # sigma_t^2 = lambda * sigma_t-1^2 + (1 - lambda) * pnl_t-1^2, started from the variance of the first window
+    initial = np.var(pnl[:window])
+    variance, _ = lfilter([1 - ewma_lambda], [1, -ewma_lambda], pnl ** 2, zi=[ewma_lambda * initial])
+    return np.sqrt(np.concatenate(([initial], variance[:-1])))
+
+def rolling_var(returns, positions, window=250, confidences=(0.95, 0.99), methods=VAR_METHODS, ewma_lambda=EWMA_LAMBDA):
+    # one-day VaR and expected shortfall forecasts of a portfolio for every day after the first window
+    # returns is a (days x assets) matrix of returns and positions the amount held in each asset
+    # the forecast for day t only uses days t-window ... t-1
+    # returns {method: (VaR, ES)} with arrays of shape (days - window, confidences), as positive losses
+    returns = np.asarray(returns, dtype=np.float64).reshape(len(returns), -1)
+    pnl = returns @ np.atleast_1d(np.asarray(positions, dtype=np.float64))
+    # every window but the last, so window i ends the day before the day it forecasts
+    windows = sliding_window_view(pnl, window)[:-1]
+    z = norm.ppf(confidences)
+    results = {}
+
+    if 'parametric' in methods:
+        mean = windows.mean(axis=1)[:, None]
+        sigma = windows.std(axis=1, ddof=1)[:, None]
+        var = z * sigma - mean
+        # expected loss beyond the VaR of a normal distribution
+        es = sigma * norm.pdf(z) / (1 - np.asarray(confidences)) - mean
+        results['parametric'] = (var, es)
+
+    if 'historical' in methods:
+        results['historical'] = _historical_var_es(-windows, confidences)
+
+    if 'filtered_historical' in methods:
+        # standardise every day by its volatility forecast, take the historical quantiles of the standardised
+        # returns and scale them back up by the volatility forecast of the day being forecast
+        volatility = ewma_volatility(pnl, ewma_lambda, window)
+        standardised = sliding_window_view(pnl / volatility, window)[:-1]
+        var, es = _historical_var_es(-standardised, confidences)
+        results['filtered_historical'] = (var * volatility[window:, None], es * volatility[window:, None])
+
+    return results
+
+def kupiec_test(exceptions, confidence):
+    # proportion of failures test: is the number of VaR exceptions consistent with probability 1-c?
+    # returns (likelihood ratio, p-value), the ratio is chi-squared with 1 degree of freedom
+    n = len(exceptions)
+    x = np.sum(exceptions)
+    p = 1 - confidence
+    log_likelihood_null = xlogy(n - x, 1 - p) + xlogy(x, p)
+    log_likelihood_observed = xlogy(n - x, 1 - x / n) + xlogy(x, x / n)
+    ratio = -2 * (log_likelihood_null - log_likelihood_observed)
+    return ratio, chi2.sf(ratio, 1)
+
+def christoffersen_test(exceptions):
+    # independence test: does an exception today make one tomorrow more likely?
+    # returns (likelihood ratio, p-value), the ratio is chi-squared with 1 degree of freedom
+    exceptions = np.asarray(exceptions, dtype=bool)
+    previous, current = exceptions[:-1], exceptions[1:]
+    n00 = np.sum(~previous & ~current)
+    n01 = np.sum(~previous & current)
+    n10 = np.sum(previous & ~current)
+    n11 = np.sum(previous & current)
+
+    pi = (n01 + n11) / (n00 + n01 + n10 + n11)
+    pi0 = n01 / (n00 + n01) if n00 + n01 > 0 else 0
+    pi1 = n11 / (n10 + n11) if n10 + n11 > 0 else 0
+    log_likelihood_null = xlogy(n00 + n10, 1 - pi) + xlogy(n01 + n11, pi)
+    log_likelihood_observed = xlogy(n00, 1 - pi0) + xlogy(n01, pi0) + xlogy(n10, 1 - pi1) + xlogy(n11, pi1)
+    ratio = -2 * (log_likelihood_null - log_likelihood_observed)
+    return ratio, chi2.sf(ratio, 1)
+
+def backtest_var(returns, positions, window=250, confidences=(0.95, 0.99), methods=VAR_METHODS, ewma_lambda=EWMA_LAMBDA):
+    # rolling VaR forecasts compared with the losses that actually happened
+    # returns {(method, confidence): {'exceptions', 'exception_rate', 'kupiec', 'christoffersen', 'conditional_coverage'}}
+    # where every test is a (likelihood ratio, p-value) pair
+    returns = np.asarray(returns, dtype=np.float64).reshape(len(returns), -1)
+    losses = -(returns @ np.atleast_1d(np.asarray(positions, dtype=np.float64)))[window:]
+    results = {}
+    for method, (var, _) in rolling_var(returns, positions, window, confidences, methods, ewma_lambda).items():
+        for i, c in enumerate(confidences):
+            exceptions = losses > var[:, i]
+            kupiec = kupiec_test(exceptions, c)
+            christoffersen = christoffersen_test(exceptions)
+            # conditional coverage: both tests together, chi-squared with 2 degrees of freedom
+            coverage = kupiec[0] + christoffersen[0]
+            results[(method, c)] = {'exceptions': int(exceptions.sum()), 'exception_rate': exceptions.mean(),
+                                    'kupiec': kupiec, 'christoffersen': christoffersen,
+                                    'conditional_coverage': (coverage, chi2.sf(coverage, 2))}
+    return results
+
+def benchmark_backtest(num_years=10, num_assets=1000, window=250):
+    rng = np.random.default_rng(0)
+    num_days = 252 * num_years
+    returns = rng.standard_t(4, (num_days, num_assets)) * 0.01
+    positions = rng.uniform(0, 1e4, num_assets)
+
+    start = time.perf_counter()
+    results = backtest_var(returns, positions, window)
+    print('%d years x %d assets, %d methods x 2 confidence levels backtested in %.2fs'
+          % (num_years, num_assets, len(VAR_METHODS), time.perf_counter() - start))
+    for (method, c), result in results.items():
+        print('%-20s %.2f exceptions %4d  Kupiec p=%.3f  Christoffersen p=%.3f'
+              % (method, c, result['exceptions'], result['kupiec'][1], result['christoffersen'][1]))
+
 if __name__ == '__main__':
     start = datetime.datetime(2020, 1, 1)
     end = datetime.datetime(2024, 1, 1)
 
-    stock_data = download_data('AAPL', start, end)
-
-    # print(stock_data)
-    log_daily_returns = np.log(stock_data/stock_data.shift(1))[1:]
+    log_daily_returns = load_returns('AAPL', start, end).frame()
 
     # this is the investment
     S = 1e6 
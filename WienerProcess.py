@@ -1,17 +1,17 @@
-import numpy.random as rand
 import numpy as np
 import matplotlib.pyplot as plt
+import StochasticProcesses
 
-def wiener_process(dt=0.1, x0=0, n=1000):
-    W = np.zeros(n+1)
-
+# with num_paths given W has shape (num_paths, n+1), one row per path
+# rng can be a numpy Generator or QuasiMonteCarlo.SobolNormals, by default the global np.random state is used
+def wiener_process(dt=0.1, x0=0, n=1000, num_paths=None, rng=None):
     t = np.linspace(x0, n, n+1)
 
     # draw n points from the normal distribution e.g. [-0.3, 0.4, 0.25, ...]
     # then cumulative sum gives [-0.3, 0.1, 0.35]
-    W[1:n+1] = np.cumsum(rand.normal(0, np.sqrt(dt), n))
+    _, W = StochasticProcesses.simulate(StochasticProcesses.WienerProcess(), 0, n*dt, n, 1 if num_paths is None else num_paths, rng)
 
-    return t, W
+    return t, W[0] if num_paths is None else W
 
 def plot_process(t, W):
     plt.plot(t, W)
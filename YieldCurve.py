@@ -0,0 +1,260 @@
+import time
+import numpy as np
+from BondPortfolio import cash_flow_matrix
+
+# instruments the curve is bootstrapped from; each one is a set of cash flows whose present value must equal its price
+# quote is what the market shows (a rate or a price) and can be changed through YieldCurve.update_quote
+
+class Deposit:
+    # money market deposit with simple interest: 1 now grows to 1 + rate * maturity at maturity
+    def __init__(self, maturity, rate):
+        self.maturity = maturity
+        self.quote = rate
+
+    def cash_flows(self):
+        return np.array([self.maturity], dtype=np.float64), np.array([1 + self.quote * self.maturity]), 1.0
+
+class FixedRateBond:
+    # coupon bond quoted by its full price per face value, cash flows as in BondPortfolio
+    def __init__(self, maturity, coupon_rate, price, frequency=2, face=100.0):
+        self.maturity = maturity
+        self.coupon_rate = coupon_rate
+        self.quote = price
+        self.frequency = frequency
+        self.face = face
+
+    def cash_flows(self):
+        times, flows, _ = cash_flow_matrix(self.face, self.coupon_rate, self.frequency, self.maturity, ragged=True)
+        return times, flows, self.quote
+
+class Swap:
+    # par interest rate swap quoted by its fixed rate: the fixed leg plus a notional of 1 at maturity is worth 1
+    def __init__(self, maturity, rate, frequency=1):
+        self.maturity = maturity
+        self.quote = rate
+        self.frequency = frequency
+
+    def cash_flows(self):
+        times, flows, _ = cash_flow_matrix(1.0, self.quote, self.frequency, self.maturity, ragged=True)
+        return times, flows, 1.0
+
+INTERPOLATION_METHODS = ('log_linear', 'monotone_convex')
+# instruments must reprice to within this amount per unit of notional
+REPRICING_TOLERANCE = 1e-12
+# limit on the Gauss-Seidel sweeps that make the monotone convex curve reprice every instrument
+MAX_SWEEPS = 50
+
+class YieldCurve:
+    # zero curve bootstrapped from instruments sorted by maturity, one pillar at each maturity, t = 0 and DF = 1 included
+    # pillar k is solved so that instrument k reprices exactly given pillars 0 ... k-1, with the discount factors of its
+    # earlier flows interpolated log-linearly (flat forwards) between pillars; the interpolation used for queries is
+    #   'log_linear'      - linear in log DF, a piecewise flat forward curve
+    #   'monotone_convex' - Hagan-West monotone convex forwards: continuous forwards that keep the sign pattern of the
+    #                       discrete forwards, with the pillars then adjusted until every instrument reprices on them
+    # update_quote only re-solves the pillars from the changed instrument on
+    # all interpolation coefficients are computed once per build, so queries are a searchsorted plus arithmetic
+    def __init__(self, instruments, interpolation='monotone_convex'):
+        if interpolation not in INTERPOLATION_METHODS:
+            raise ValueError('unknown interpolation %r' % interpolation)
+        self.instruments = sorted(instruments, key=lambda instrument: instrument.maturity)
+        self.interpolation = interpolation
+        self.times = np.concatenate(([0.0], [instrument.maturity for instrument in self.instruments]))
+        if np.any(np.diff(self.times) <= 0):
+            raise ValueError('instrument maturities must be positive and distinct')
+        self.log_df = np.zeros(len(self.times))
+        # (times, amounts, price) of every instrument, only rebuilt for instruments whose quote changed
+        self.flows = [None] * len(self.instruments)
+        self._bootstrap(0)
+
+    def _bootstrap(self, start):
+        # solves pillars start+1, start+2, ... from instruments start, start+1, ...
+        # earlier pillars do not depend on later quotes so they are kept as they are
+        for k in range(start, len(self.instruments)):
+            self.flows[k] = self.instruments[k].cash_flows()
+            times, flows, price = self.flows[k]
+            left, right = self.times[k], self.times[k+1]
+            earlier = times <= left
+            known = flows[earlier] @ self._log_linear(times[earlier], k + 1) if earlier.any() else 0.0
+            # flows in the last segment: DF = exp((1 - w) L_left + w L), Newton's method in L = log DF(right)
+            weight = (times[~earlier] - left) / (right - left)
+            amount = flows[~earlier] * np.exp((1 - weight) * self.log_df[k])
+            log_df = self.log_df[k] - 0.03 * (right - left)
+            for _ in range(50):
+                terms = amount * np.exp(weight * log_df)
+                step = (known + terms.sum() - price) / (weight @ terms)
+                log_df -= step
+                if abs(step) < 1e-15:
+                    break
+            self.log_df[k+1] = log_df
+        self._coefficients(start)
+        if self.interpolation == 'monotone_convex':
+            self._refine()
+
+    def _residual(self, k):
+        times, flows, price = self.flows[k]
+        return flows @ self.discount_factor(times) - price
+
+    def _refine(self):
+        # with monotone convex interpolation the discount factors between pillars depend on the neighbouring pillars,
+        # so the flat forward pillars do not quite reprice instruments with flows between pillars; Gauss-Seidel sweeps
+        # move every pillar until its instrument reprices on the interpolated curve itself, each sweep starting from
+        # the first instrument that does not (after a quote update, the ones just before it at the earliest)
+        for _ in range(MAX_SWEEPS):
+            residuals = np.array([self._residual(k) for k in range(len(self.instruments))])
+            failing = np.flatnonzero(np.abs(residuals) > REPRICING_TOLERANCE)
+            if len(failing) == 0:
+                return
+            for k in range(failing[0], len(self.instruments)):
+                # d price / d log DF(pillar) is close to the present value of the flows in the last segment
+                # weighted by their position in it
+                times, flows, _ = self.flows[k]
+                in_segment = times > self.times[k]
+                weight = (times[in_segment] - self.times[k]) / self.lengths[k]
+                slope = flows[in_segment] * self.discount_factor(times[in_segment]) @ weight
+                self.log_df[k+1] -= self._residual(k) / slope
+                self._coefficients(k)
+
+    def _log_linear(self, t, num_pillars):
+        # discount factors from the first num_pillars pillars with log-linear interpolation, used while bootstrapping
+        times, log_df = self.times[:num_pillars], self.log_df[:num_pillars]
+        return np.exp(np.interp(t, times, log_df))
+
+    def _coefficients(self, start):
+        # per segment i (from times[i-1] to times[i]): discrete forward f^d_i, and for monotone convex the forwards
+        # f_i at the pillars and the shape of the correction g(x) = f(t) - f^d_i on the segment
+        # only segments from start on can have changed (node forwards also depend on the segment before)
+        self.lengths = np.diff(self.times)
+        self.discrete_forwards = -np.diff(self.log_df) / self.lengths
+        if self.interpolation == 'log_linear':
+            return
+
+        fd, lengths = self.discrete_forwards, self.lengths
+        first = max(start - 1, 0)
+        if first == 0 or not hasattr(self, 'node_forwards') or len(self.node_forwards) != len(self.times):
+            first = 0
+            self.node_forwards = np.empty(len(self.times))
+            self.g0, self.g1 = np.empty(len(fd)), np.empty(len(fd))
+            self.region, self.eta, self.level = np.empty(len(fd), dtype=int), np.empty(len(fd)), np.empty(len(fd))
+
+        f = self.node_forwards
+        # forwards at the interior pillars are length weighted averages of the neighbouring discrete forwards
+        f[1:-1] = (lengths[:-1] * fd[1:] + lengths[1:] * fd[:-1]) / (lengths[:-1] + lengths[1:])
+        f[0] = fd[0] - 0.5 * (f[1] - fd[0]) if len(fd) > 1 else fd[0]
+        f[-1] = fd[-1] - 0.5 * (f[-2] - fd[-1]) if len(fd) > 1 else fd[-1]
+
+        segments = slice(first, len(fd))
+        g0 = f[:-1][segments] - fd[segments]
+        g1 = f[1:][segments] - fd[segments]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # the four regions of Hagan and West, decided by the signs and relative size of g0 and g1
+            region = np.full(len(g0), 4)
+            region[((g0 < 0) & (-0.5 * g0 <= g1) & (g1 <= -2 * g0)) | ((g0 > 0) & (-0.5 * g0 >= g1) & (g1 >= -2 * g0))] = 1
+            region[((g0 < 0) & (g1 > -2 * g0)) | ((g0 > 0) & (g1 < -2 * g0))] = 2
+            region[((g0 > 0) & (0 > g1) & (g1 > -0.5 * g0)) | ((g0 < 0) & (0 < g1) & (g1 < -0.5 * g0))] = 3
+            region[(g0 == 0) & (g1 == 0)] = 0
+            eta = np.select([region == 2, region == 3, region == 4],
+                            [(g1 + 2 * g0) / (g1 - g0), 3 * g1 / (g1 - g0), g1 / (g1 + g0)], 0.0)
+            level = np.where(region == 4, -g0 * g1 / (g0 + g1), 0.0)
+        self.g0[segments], self.g1[segments] = g0, g1
+        self.region[segments], self.eta[segments], self.level[segments] = region, eta, level
+
+    def update_quote(self, index, quote):
+        # new quote for instruments[index] (in maturity order); pillars before it are unchanged, so the bootstrap
+        # restarts from that instrument and the interpolation coefficients are refreshed from the segment before it
+        self.instruments[index].quote = quote
+        self._bootstrap(index)
+
+    def _integrated_correction(self, segment, x):
+        # integral of g from 0 to x on every queried segment, so that log DF is continuous and exact at the pillars
+        g0, g1, eta, A = self.g0[segment], self.g1[segment], self.eta[segment], self.level[segment]
+        region = self.region[segment]
+        result = np.zeros_like(x)
+
+        mask = region == 1
+        xm = x[mask]
+        result[mask] = g0[mask] * (xm - 2 * xm ** 2 + xm ** 3) + g1[mask] * (xm ** 3 - xm ** 2)
+
+        mask = region == 2
+        xm, e = x[mask], eta[mask]
+        result[mask] = g0[mask] * xm + (g1[mask] - g0[mask]) * np.maximum(xm - e, 0) ** 3 / (3 * (1 - e) ** 2)
+
+        mask = region == 3
+        xm, e = x[mask], eta[mask]
+        inside = 1 - np.maximum(1 - xm / e, 0) ** 3
+        result[mask] = g1[mask] * xm + (g0[mask] - g1[mask]) * e / 3 * inside
+
+        mask = region == 4
+        xm, e, a = x[mask], eta[mask], A[mask]
+        inside = 1 - np.maximum(1 - xm / e, 0) ** 3
+        result[mask] = (a * xm + (g0[mask] - a) * e / 3 * inside
+                        + (g1[mask] - a) * np.maximum(xm - e, 0) ** 3 / (3 * (1 - e) ** 2))
+        return result
+
+    def log_discount_factor(self, t):
+        t = np.maximum(np.asarray(t, dtype=np.float64), 0)
+        # segment i covers (times[i], times[i+1]], beyond the last pillar the last segment is extended
+        segment = np.clip(np.searchsorted(self.times, t, side='left') - 1, 0, len(self.lengths) - 1)
+        left = self.times[segment]
+        if self.interpolation == 'log_linear':
+            return self.log_df[segment] - self.discrete_forwards[segment] * (t - left)
+
+        beyond = t > self.times[-1]
+        x = np.minimum((t - left) / self.lengths[segment], 1)
+        result = self.log_df[segment] - self.lengths[segment] * (self.discrete_forwards[segment] * x
+                                                                 + self._integrated_correction(segment, x))
+        # flat instantaneous forward after the last pillar
+        return np.where(beyond, self.log_df[-1] - self.node_forwards[-1] * (t - self.times[-1]), result)
+
+    def discount_factor(self, t):
+        # discount factors for times of any shape, in one vectorized call
+        return np.exp(self.log_discount_factor(t))
+
+    def zero_rate(self, t):
+        # continuously compounded zero rates, the short end (t = 0) gets the first forward
+        t = np.asarray(t, dtype=np.float64)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rate = -self.log_discount_factor(t) / t
+        first = self.discrete_forwards[0] if self.interpolation == 'log_linear' else self.node_forwards[0]
+        return np.where(t > 0, rate, first)
+
+    def forward_rate(self, t1, t2):
+        # continuously compounded forward rate between t1 and t2
+        return (self.log_discount_factor(t1) - self.log_discount_factor(t2)) / (np.asarray(t2) - np.asarray(t1))
+
+def example_instruments():
+    # deposits up to a year, then semi-annual government bonds and annual swaps
+    return ([Deposit(t, r) for t, r in ((1 / 12, 0.0450), (0.25, 0.0460), (0.5, 0.0470), (1.0, 0.0475))]
+            + [FixedRateBond(2.0, 0.045, 100.20), FixedRateBond(3.0, 0.04, 98.90)]
+            + [Swap(t, r) for t, r in ((4, 0.0420), (5, 0.0415), (7, 0.0410), (10, 0.0412), (15, 0.0418),
+                                       (20, 0.0420), (30, 0.0415))])
+
+def benchmark_yield_curve(num_times=10**7):
+    rng = np.random.default_rng(0)
+    times = rng.uniform(0, 30, num_times)
+    for interpolation in INTERPOLATION_METHODS:
+        start = time.perf_counter()
+        curve = YieldCurve(example_instruments(), interpolation)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        curve.discount_factor(times)
+        query = time.perf_counter() - start
+
+        start = time.perf_counter()
+        curve.update_quote(len(curve.instruments) - 2, 0.0425)
+        update = time.perf_counter() - start
+
+        # every instrument reprices from the curve
+        errors = []
+        for instrument in curve.instruments:
+            t, flows, price = instrument.cash_flows()
+            errors.append(abs(flows @ curve.discount_factor(t) - price))
+        print('%-16s build %.2fms, %d discount factors in %.2fs, update of the 20y quote %.2fms, largest repricing error %.1e'
+              % (interpolation, build * 1000, num_times, query, update * 1000, max(errors)))
+
+if __name__ == '__main__':
+    curve = YieldCurve(example_instruments())
+    t = np.array([0.25, 0.5, 1, 2, 5, 10, 30])
+    print('Zero rates:', curve.zero_rate(t).round(5))
+    print('Discount factors:', curve.discount_factor(t).round(5))
+    benchmark_yield_curve()
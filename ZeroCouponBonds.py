@@ -1,13 +1,16 @@
 from math import exp
+from BondPortfolio import price_bonds
 
 class ZeroCouponBond:
-    def __init__(self, principal, maturity, interest_rate):
+    def __init__(self, principal, maturity, interest_rate=None, curve=None):
         # principal amount
         self.principal = principal
         # date to maturity
         self.maturity = maturity
         # market interest for discounting
-        self.interest_rate = interest_rate / 100
+        self.interest_rate = None if interest_rate is None else interest_rate / 100
+        # or a zero curve (e.g. YieldCurve.YieldCurve) to discount on instead
+        self.curve = curve
     
     def present_value(self, x, n):
         return x / (1 + self.interest_rate) ** n
@@ -16,7 +19,8 @@ class ZeroCouponBond:
         return x * exp(-self.interest_rate * t)
 
     def calculate_price(self):
-        return self.present_value(self.principal, self.maturity)
+        # a single cash flow, the principal, at maturity
+        return float(price_bonds(self.principal, 0, self.maturity, self.interest_rate, self.curve, frequency=0)[0])
     
 if __name__ == '__main__':
     bond = ZeroCouponBond(principal=1000, maturity=2, interest_rate=4)
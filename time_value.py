@@ -1,16 +1,22 @@
-from math import exp
+import numpy as np
+
+# x, r, n and t can be arrays (e.g. all the cash flows of a portfolio at once) and r can also be a curve,
+# any object with a vectorized discount_factor(t) such as YieldCurve.YieldCurve, in which case n and t are in years
+
+def _is_curve(r):
+    return hasattr(r, 'discount_factor')
 
 def future_discrete_value(x, r, n):
-    return x * (1 + r) ** n
+    return x / r.discount_factor(n) if _is_curve(r) else x * (1 + np.asarray(r, dtype=float)) ** np.asarray(n, dtype=float)
 
 def present_discrete_value(x, r, n):
-    return x * (1 + r) ** -n
+    return x * r.discount_factor(n) if _is_curve(r) else x * (1 + np.asarray(r, dtype=float)) ** -np.asarray(n, dtype=float)
 
 def future_continuous_value(x, r, t):
-    return x * exp(r * t)
+    return x / r.discount_factor(t) if _is_curve(r) else x * np.exp(np.multiply(r, t))
 
 def present_continuous_value(x, r, t):
-    return x * exp(-r * t)
+    return x * r.discount_factor(t) if _is_curve(r) else x * np.exp(-np.multiply(r, t))
 
 if __name__ == '__main__':
     x = 100 # value of investment
@@ -22,4 +28,9 @@ if __name__ == '__main__':
     print("Future Discrete Value:", future_discrete_value(x, r, n))
     print("Present Discrete Value:", present_discrete_value(x, r, n))
     print("Future Continuous Value:", future_continuous_value(x, r, t))
-    print("Present Continuous Value:", present_continuous_value(x, r, t))
\ No newline at end of file
+    print("Present Continuous Value:", present_continuous_value(x, r, t))
+
+    # every cash flow of a schedule discounted against a bootstrapped zero curve in one call
+    from YieldCurve import YieldCurve, example_instruments
+    curve = YieldCurve(example_instruments())
+    print("Present Values on the curve:", present_continuous_value(np.full(5, x), curve, np.arange(1, 6)))
\ No newline at end of file